@@ -0,0 +1,200 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import increment
+
+TOKEN_KEY = 'auth-token:{}'
+VERSION_KEY = 'auth-user:{}'
+VERSION_TTL = 24 * 60 * 60
+HITS_KEY = 'auth-cache:hits'
+MISSES_KEY = 'auth-cache:misses'
+# Пароль в снимок не попадает: он подгружается из БД, только если нужен
+# (смена пароля, check_password). last_login меняется без сброса кэша,
+# поэтому тоже не хранится: иначе save() пользователя из снимка
+# перезаписал бы более новое значение.
+EXCLUDED_FIELDS = {'password', 'last_login'}
+
+
+def _shared_key(key):
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def _version_key(user_id):
+    return VERSION_KEY.format(user_id)
+
+
+def _current_version(user_id):
+    """Версия пользователя в общем кэше; создаётся при первом обращении."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, VERSION_TTL):
+            version = cache.get(key, version)
+    return version
+
+
+class TokenCache:
+    """
+    LRU токен -> снимок пользователя в памяти процесса.
+
+    Снимок хранится вместе с версией пользователя из общего кэша, и при
+    каждом попадании версия сверяется: выход, смена пароля или
+    блокировка в любом воркере удаляют версию, и снимок перестаёт
+    действовать сразу во всех процессах. Запись живёт TOKEN_CACHE_TTL
+    секунд; при TOKEN_CACHE_SHARED_TTL снимки дополнительно хранятся
+    в общем кэше.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._pending = [0, 0]
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+            else:
+                self._entries.pop(key, None)
+                entry = None
+        snapshot = None
+        if entry is not None:
+            _, snapshot, version = entry
+        elif settings.TOKEN_CACHE_SHARED_TTL:
+            snapshot, version = cache.get(_shared_key(key), (None, None))
+        if (snapshot is not None
+                and cache.get(_version_key(snapshot['id'])) != version):
+            # Пользователь изменился или вышел после записи снимка.
+            with self._lock:
+                self._entries.pop(key, None)
+            snapshot = None
+        elif snapshot is not None and entry is None:
+            self._put(key, snapshot, version)
+        self._record(hit=snapshot is not None)
+        return snapshot
+
+    def set(self, key, snapshot):
+        version = _current_version(snapshot['id'])
+        self._put(key, snapshot, version)
+        if settings.TOKEN_CACHE_SHARED_TTL:
+            cache.set(_shared_key(key), (snapshot, version),
+                      settings.TOKEN_CACHE_SHARED_TTL)
+
+    def _put(self, key, snapshot, version):
+        expires = time.monotonic() + settings.TOKEN_CACHE_TTL
+        with self._lock:
+            self._entries[key] = (expires, snapshot, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def evict(self, keys=(), user_id=None):
+        """
+        Удаляет токены keys и все снимки пользователя user_id,
+        в том числе в памяти других воркеров.
+        """
+        keys = set(keys)
+        with self._lock:
+            if user_id is not None:
+                keys.update(key for key, (_, snapshot, _) in
+                            self._entries.items()
+                            if snapshot['id'] == user_id)
+            for key in keys:
+                self._entries.pop(key, None)
+        shared = []
+        if user_id is not None:
+            shared.append(_version_key(user_id))
+        if settings.TOKEN_CACHE_SHARED_TTL:
+            shared.extend(_shared_key(key) for key in keys)
+        if shared:
+            cache.delete_many(shared)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _record(self, hit):
+        # Счётчики сбрасываются в общий кэш пачками, чтобы не писать
+        # в него на каждом запросе.
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._pending[not hit] += 1
+            if sum(self._pending) < settings.TOKEN_CACHE_STATS_EVERY:
+                return
+            hits, misses = self._pending
+            self._pending = [0, 0]
+        increment(HITS_KEY, hits)
+        increment(MISSES_KEY, misses)
+
+    def stats(self):
+        """Попадания по всем воркерам и по текущему процессу."""
+        hits = cache.get(HITS_KEY, 0) + self._pending[0]
+        misses = cache.get(MISSES_KEY, 0) + self._pending[1]
+        total = hits + misses
+        local = self.hits + self.misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else None,
+            'process_hit_rate': (round(self.hits / local, 4)
+                                 if local else None),
+            'size': len(self._entries),
+        }
+
+
+token_cache = TokenCache()
+
+
+def snapshot(user):
+    """Поля пользователя, по которым строится request.user."""
+    return {field.attname: getattr(user, field.attname)
+            for field in user._meta.concrete_fields
+            if field.attname not in EXCLUDED_FIELDS}
+
+
+def restore(data):
+    """Новый экземпляр пользователя из снимка на каждый запрос."""
+    model = get_user_model()
+    return model.from_db(router.db_for_read(model), list(data),
+                         list(data.values()))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса к БД для недавно виденных токенов.
+
+    При попадании request.auth — несохранённый Token с тем же ключом.
+    """
+
+    def authenticate_credentials(self, key):
+        if not settings.TOKEN_CACHE_SIZE:
+            return super().authenticate_credentials(key)
+        data = token_cache.get(key)
+        if data is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, snapshot(user))
+            return user, token
+        if not data['is_active']:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        user = restore(data)
+        return user, self.get_model()(key=key, user=user)
@@ -0,0 +1,233 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .compiled import compile_serializer
+from .fields import image_size
+from .prefetch import QueryPlan
+from .subscriptions import get_resolver
+
+
+RECIPE_VERSION_KEY = 'recipe-version:{}'
+AUTHOR_VERSION_KEY = 'author-version:{}'
+CATALOG_VERSION_KEY = 'catalog-version'
+INGREDIENT_VERSION_KEY = 'ingredient-version'
+FRAGMENT_KEY = 'recipe:{}:{}:{}:{}:{}'
+HITS_KEY = 'recipe-cache:hits'
+MISSES_KEY = 'recipe-cache:misses'
+
+
+def _new_version():
+    # Версия по времени, а не счётчик: если ключ версии вытеснен из кэша,
+    # новая версия не совпадёт ни с одним старым фрагментом.
+    return time.time_ns()
+
+
+def _bump(key):
+    transaction.on_commit(lambda: cache.set(key, _new_version(), None))
+
+
+def bump_recipe(recipe_id):
+    """Сбрасывает фрагмент рецепта: сохранение, теги, ингредиенты."""
+    _bump(RECIPE_VERSION_KEY.format(recipe_id))
+
+
+def bump_author(author_id):
+    """Сбрасывает фрагменты всех рецептов автора (аватар, профиль)."""
+    _bump(AUTHOR_VERSION_KEY.format(author_id))
+
+
+def bump_catalog():
+    """Сбрасывает все фрагменты при изменении тегов или ингредиентов."""
+    _bump(CATALOG_VERSION_KEY)
+
+
+def bump_ingredients():
+    """Сбрасывает индексы ингредиентов во всех процессах."""
+    _bump(INGREDIENT_VERSION_KEY)
+
+
+def ingredient_version():
+    return _versions([INGREDIENT_VERSION_KEY])[INGREDIENT_VERSION_KEY]
+
+
+def _versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def increment(key, delta):
+    """
+    Счётчик в общем кэше; нулевое приращение не пишется.
+
+    В Redis add и incr атомарны; в файловом кэше одновременные
+    приращения из разных процессов могут теряться.
+    """
+    if not delta:
+        return
+    if cache.add(key, delta, None):
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+
+
+class Counters:
+    """
+    Счётчики процесса, которые пишутся в общий кэш пачкой: по одному
+    incr на ключ раз в столько событий, сколько задано в настройке
+    setting, а не на каждый запрос.
+    """
+
+    def __init__(self, keys, setting):
+        self.keys = tuple(keys)
+        self.setting = setting
+        self._pending = dict.fromkeys(self.keys, 0)
+        self._lock = threading.Lock()
+
+    def add(self, deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self._pending[key] += delta
+            if (sum(self._pending.values())
+                    < getattr(settings, self.setting)):
+                return
+            pending = self._pending
+            self._pending = dict.fromkeys(self.keys, 0)
+        for key, delta in pending.items():
+            increment(key, delta)
+
+    def totals(self):
+        """Значения по всем процессам вместе с ещё не записанными."""
+        stored = cache.get_many(self.keys)
+        with self._lock:
+            return {key: stored.get(key, 0) + self._pending[key]
+                    for key in self.keys}
+
+
+fragment_counters = Counters((HITS_KEY, MISSES_KEY),
+                             'RECIPE_CACHE_STATS_EVERY')
+
+
+def stats():
+    """Счётчики попаданий и промахов кэша фрагментов."""
+    totals = fragment_counters.totals()
+    hits, misses = totals[HITS_KEY], totals[MISSES_KEY]
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+    }
+
+
+class RecipeFragmentCache:
+    """
+    Кэш независимой от пользователя части RecipeReadSerializer.
+
+    Ключ фрагмента включает версии рецепта, автора и справочников
+    и размер изображений (?image_size), поэтому инвалидация — это
+    смена версии, а не поиск ключей.
+    Флаги is_favorited, is_in_shopping_cart и is_subscribed
+    подставляются при ответе: первые два из аннотаций queryset,
+    подписки — через резолвер запроса, одним запросом на страницу.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    def prepare(self, queryset, context):
+        """Queryset для страницы: только аннотации флагов пользователя."""
+        serializer = self.serializer_class(context=context)
+        return QueryPlan(serializer, queryset.model).annotate(queryset)
+
+    def _keys(self, recipes, size):
+        """Ключи фрагментов и самая свежая из их версий."""
+        version_keys = {CATALOG_VERSION_KEY}
+        for recipe in recipes:
+            version_keys.add(RECIPE_VERSION_KEY.format(recipe.pk))
+            version_keys.add(AUTHOR_VERSION_KEY.format(recipe.author_id))
+        versions = _versions(list(version_keys))
+        keys = {}
+        for recipe in recipes:
+            parts = (versions[RECIPE_VERSION_KEY.format(recipe.pk)],
+                     versions[AUTHOR_VERSION_KEY.format(recipe.author_id)],
+                     versions[CATALOG_VERSION_KEY])
+            keys[recipe.pk] = (
+                FRAGMENT_KEY.format(recipe.pk, *parts, size or ''),
+                max(parts))
+        return keys
+
+    @staticmethod
+    def _cacheable(recipe, version):
+        # Реплика может ещё не содержать изменение, сменившее версию:
+        # такой фрагмент не кэшируется, пока не пройдёт окно отставания.
+        if recipe._state.db == DEFAULT_DB_ALIAS:
+            return True
+        lag = settings.REPLICA_PIN_SECONDS * 10 ** 9
+        return version < _new_version() - lag
+
+    def build(self, recipes, size=None):
+        """Собирает фрагменты рецептов без контекста пользователя."""
+        serializer = self.serializer_class(context={'image_size': size})
+        QueryPlan(serializer).prefetch_objects(recipes)
+        if settings.FAST_SERIALIZER:
+            represent = compile_serializer(serializer)
+        else:
+            represent = serializer.to_representation
+        return [represent(recipe) for recipe in recipes]
+
+    def fragments(self, recipes, size=None):
+        timeout = settings.RECIPE_CACHE_TIMEOUT
+        if not timeout:
+            return self.build(recipes, size)
+        keys = self._keys(recipes, size)
+        cached = cache.get_many([key for key, _ in keys.values()])
+        missing = [recipe for recipe in recipes
+                   if keys[recipe.pk][0] not in cached]
+        fragment_counters.add({HITS_KEY: len(recipes) - len(missing),
+                               MISSES_KEY: len(missing)})
+        if missing:
+            built = dict(zip((keys[recipe.pk][0] for recipe in missing),
+                             self.build(missing, size)))
+            cache.set_many({
+                keys[recipe.pk][0]: built[keys[recipe.pk][0]]
+                for recipe in missing
+                if self._cacheable(recipe, keys[recipe.pk][1])
+            }, timeout)
+            cached.update(built)
+        return [cached[keys[recipe.pk][0]] for recipe in recipes]
+
+    def render(self, recipes, request):
+        """Ответ для страницы рецептов с подставленными флагами."""
+        recipes = list(recipes)
+        fragments = self.fragments(recipes,
+                                   image_size({'request': request}))
+        resolver = get_resolver(request)
+        resolver.prime(recipe.author_id for recipe in recipes)
+
+        data = []
+        for recipe, fragment in zip(recipes, fragments):
+            item = dict(fragment)
+            item['is_favorited'] = getattr(recipe, 'is_favorited', False)
+            item['is_in_shopping_cart'] = getattr(
+                recipe, 'is_in_shopping_cart', False)
+            item['image'] = self._absolute(request, item['image'])
+            author = item['author'] = dict(item['author'])
+            author['is_subscribed'] = resolver.is_subscribed(
+                recipe.author_id)
+            author['avatar'] = self._absolute(request, author['avatar'])
+            data.append(item)
+        return data
+
+    @staticmethod
+    def _absolute(request, url):
+        return request.build_absolute_uri(url) if url else url
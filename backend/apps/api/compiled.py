@@ -0,0 +1,99 @@
+import operator
+from collections.abc import Mapping
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.manager import BaseManager
+from rest_framework import serializers
+from rest_framework.fields import SkipField, get_attribute
+
+
+def _plain_path(model, attrs):
+    """Путь из обычных атрибутов модели, без методов, — для attrgetter."""
+    for attr in attrs:
+        if model is None or callable(getattr(model, attr, None)):
+            return False
+        try:
+            model = model._meta.get_field(attr).related_model
+        except FieldDoesNotExist:
+            model = None
+    return True
+
+
+def _getter(field, model):
+    """Быстрое чтение атрибута для field и запасной путь DRF."""
+    attrs = field.source_attrs
+    if not attrs:
+        return lambda instance: instance
+    if (isinstance(field, (serializers.RelatedField,
+                           serializers.ManyRelatedField))
+            or not _plain_path(model, attrs)):
+        return field.get_attribute
+    fast = operator.attrgetter('.'.join(attrs))
+
+    def get(instance):
+        try:
+            return fast(instance)
+        except AttributeError:
+            # None в середине пути и прочие случаи — как в DRF.
+            return field.get_attribute(instance)
+
+    return get
+
+
+def _converter(field):
+    if isinstance(field, serializers.ListSerializer):
+        child = compile_serializer(field.child)
+
+        def convert(data):
+            if isinstance(data, BaseManager):
+                data = data.all()
+            return [child(item) for item in data]
+
+        return convert
+    if isinstance(field, serializers.BaseSerializer):
+        return compile_serializer(field)
+    if isinstance(field, serializers.SerializerMethodField):
+        return getattr(field.parent, field.method_name)
+    method = type(field).to_representation
+    if method is serializers.IntegerField.to_representation:
+        return int
+    if method is serializers.CharField.to_representation:
+        return str
+    if method is serializers.ReadOnlyField.to_representation:
+        return lambda value: value
+    return field.to_representation
+
+
+def compile_serializer(serializer):
+    """
+    Функция instance -> dict, совпадающая с serializer.to_representation.
+
+    Поля разбираются один раз: чтение атрибутов идёт через attrgetter,
+    простые поля приводятся int/str, вложенные сериализаторы
+    компилируются рекурсивно. Остальные поля вызывают свой
+    to_representation. Строки .values() (словари) читаются как в DRF.
+    """
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    plan = []
+    for field in serializer._readable_fields:
+        plan.append((field.field_name,
+                     field,
+                     _getter(field, model),
+                     _converter(field)))
+
+    def to_representation(instance):
+        mapping = isinstance(instance, Mapping)
+        result = {}
+        for name, field, get, convert in plan:
+            try:
+                if mapping:
+                    value = (get_attribute(instance, field.source_attrs)
+                             if field.source_attrs else instance)
+                else:
+                    value = get(instance)
+            except SkipField:
+                continue
+            result[name] = None if value is None else convert(value)
+        return result
+
+    return to_representation
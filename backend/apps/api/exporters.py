@@ -0,0 +1,51 @@
+import csv
+import json
+
+
+class _Echo:
+    """Буфер для csv.writer, который просто возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def export_txt(items):
+    yield 'Список покупок:'
+    for item in items:
+        yield (f'\n{item["name"]} ({item["measurement_unit"]})'
+               f' — {item["amount"]}')
+
+
+def export_csv(items):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in items:
+        yield writer.writerow((item['name'],
+                               item['measurement_unit'],
+                               item['amount']))
+
+
+def export_json(items):
+    yield '['
+    separator = ''
+    for item in items:
+        yield separator + json.dumps(
+            {'name': item['name'],
+             'measurement_unit': item['measurement_unit'],
+             'amount': item['amount']},
+            ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+# Формат -> (функция выгрузки, расширение файла, content type).
+EXPORTERS = {
+    'txt': (export_txt, 'txt', 'text/plain; charset=utf-8'),
+    'csv': (export_csv, 'csv', 'text/csv; charset=utf-8'),
+    'json': (export_json, 'json', 'application/json; charset=utf-8'),
+}
+
+
+def encode(chunks):
+    for chunk in chunks:
+        yield chunk.encode('utf-8')
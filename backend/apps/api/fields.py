@@ -1,19 +1,81 @@
 import base64
+import re
+import tempfile
 import uuid
-import imghdr
-from django.core.files.base import ContentFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from rest_framework import serializers
 
+from .images import derivative_name
+
+
+def image_size(context):
+    """Размер производной из контекста или ?image_size запроса."""
+    if 'image_size' in context:
+        size = context['image_size']
+    else:
+        request = context.get('request')
+        size = request and request.query_params.get('image_size')
+    return size if size in settings.IMAGE_DERIVATIVES else None
+
+
+class SizedImageField(serializers.ImageField):
+    """
+    ImageField, который отдаёт ссылку на производную размера image_size.
+
+    Пока производная не построена, отдаётся оригинал.
+    """
 
-class Base64ImageField(serializers.ImageField):
+    def to_representation(self, value):
+        size = image_size(self.context)
+        if value and size:
+            name = derivative_name(value.name, size)
+            if value.storage.exists(name):
+                url = value.storage.url(name)
+                request = self.context.get('request')
+                return request.build_absolute_uri(url) if request else url
+        return super().to_representation(value)
+
+
+class Base64ImageField(SizedImageField):
+    """
+    Изображение в виде data:image/...;base64 или файла multipart-формы.
+
+    base64 декодируется частями во временный файл (небольшие
+    изображения остаются в памяти), поэтому рядом со строкой не
+    держится вторая, раскодированная копия.
+    """
+
+    chunk_size = 64 * 1024
+
+    def _decode(self, header, b64):
+        # Части должны быть кратны 4 символам — пробелы мешают.
+        if re.search(r'\s', b64):
+            b64 = re.sub(r'\s', '', b64)
+        buffer = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        for start in range(0, len(b64), self.chunk_size):
+            buffer.write(base64.b64decode(
+                b64[start:start + self.chunk_size], validate=True))
+        # Расширение из заголовка нужно только валидатору ImageField,
+        # итоговое имя строится по формату, определённому Pillow.
+        name = 'image.' + header.partition('/')[2]
+        upload = UploadedFile(buffer, name, size=buffer.tell())
+        upload.seek(0)
+        return upload
 
     def to_internal_value(self, image_data):
         if isinstance(image_data, str) and image_data.startswith("data:image"):
-            header, b64 = image_data.split(";base64,")
-            file_data = base64.b64decode(b64)
-            ext = imghdr.what(None, h=file_data) or "jpg"
-            image_uuid = uuid.uuid4()
-            file_name = f"{image_uuid}.{ext}"
-            image_data = ContentFile(file_data, name=file_name)
-
-        return super().to_internal_value(image_data)
+            try:
+                header, b64 = image_data.split(";base64,")
+                image_data = self._decode(header, b64)
+            except Exception:
+                self.fail('invalid_image')
+
+        file = super().to_internal_value(image_data)
+        # Имя файла из формы клиента не используется, как и для base64.
+        image_format = file.image.format
+        ext = {'JPEG': 'jpg'}.get(image_format, image_format.lower())
+        file.name = f"{uuid.uuid4()}.{ext}"
+        return file
@@ -1,6 +1,7 @@
 import django_filters as filters
 
 from apps.recipes.models import Recipe, Ingredient
+from .ingredient_index import ranked
 
 
 class RecipeFilter(filters.FilterSet):
@@ -28,7 +29,11 @@ class RecipeFilter(filters.FilterSet):
 
 class IngredientFilter(filters.FilterSet):
     name = filters.CharFilter(field_name='name', lookup_expr='istartswith')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Ingredient
-        fields = ('name',)
+        fields = ('name', 'search')
+
+    def filter_search(self, queryset, name, value):
+        return ranked(queryset, value)
@@ -0,0 +1,193 @@
+import io
+import logging
+import multiprocessing
+import os
+import posixpath
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import models, transaction
+from PIL import Image, ImageOps
+
+
+DERIVATIVES_DIR = 'derivatives'
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+
+logger = logging.getLogger(__name__)
+_executor = None
+
+
+def derivative_name(name, size):
+    """Имя производной: recipes/a.png -> recipes/derivatives/card/a.webp."""
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    extension = EXTENSIONS[settings.IMAGE_DERIVATIVE_FORMAT]
+    return posixpath.join(directory, DERIVATIVES_DIR, size,
+                          f'{stem}.{extension}')
+
+
+def render(data, sizes, image_format):
+    """
+    Уменьшенные копии изображения в формате image_format.
+
+    Выполняется в процессе пула, поэтому получает и возвращает байты
+    и не обращается к Django.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        original = ImageOps.exif_transpose(original)
+        if image_format == 'JPEG':
+            original = original.convert('RGB')
+        elif original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA')
+        result = {}
+        for size, box in sizes.items():
+            image = original.copy()
+            image.thumbnail(box, Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, image_format, quality=82)
+            result[size] = buffer.getvalue()
+    return result
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn: дочерний процесс не наследует соединения с БД и потоки.
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def _submit(*args):
+    global _executor
+    try:
+        return _get_executor().submit(render, *args)
+    except BrokenProcessPool:
+        # Упавший воркер ломает весь пул — создаём новый.
+        _executor = None
+        return _get_executor().submit(render, *args)
+
+
+def has_derivatives(field_file):
+    sizes = list(settings.IMAGE_DERIVATIVES)
+    return bool(sizes) and field_file.storage.exists(
+        derivative_name(field_file.name, sizes[-1]))
+
+
+def _store(storage, name, results):
+    for size, data in results.items():
+        # Хранилище заменяет производную атомарно, без удаления.
+        storage.save(derivative_name(name, size), ContentFile(data))
+
+
+def generate(field_file, on_ready=None, wait=False):
+    """
+    Строит производные изображения field_file.
+
+    По умолчанию работа уходит в пул процессов (IMAGE_WORKERS),
+    а файлы сохраняются по готовности; on_ready вызывается после
+    сохранения. При IMAGE_WORKERS = 0 или wait=True всё выполняется
+    в текущем процессе.
+    """
+    storage, name = field_file.storage, field_file.name
+    with storage.open(name, 'rb') as source:
+        data = source.read()
+    args = (data, settings.IMAGE_DERIVATIVES,
+            settings.IMAGE_DERIVATIVE_FORMAT)
+
+    def done(results):
+        _store(storage, name, results)
+        if on_ready is not None:
+            on_ready()
+
+    if wait or not settings.IMAGE_WORKERS:
+        done(render(*args))
+        return
+
+    def finished(future):
+        if future.exception() is not None:
+            logger.error('Не удалось построить производные %s', name,
+                         exc_info=future.exception())
+            return
+        done(future.result())
+
+    _submit(*args).add_done_callback(finished)
+
+
+def schedule(field_file, on_ready=None):
+    """Запускает генерацию производных после коммита транзакции."""
+    if not field_file or not settings.IMAGE_DERIVATIVES:
+        return
+
+    def start():
+        # Ошибка обработки не должна ломать уже сохранённый запрос.
+        try:
+            if not has_derivatives(field_file):
+                generate(field_file, on_ready)
+        except Exception:
+            logger.exception('Не удалось построить производные %s',
+                             field_file.name)
+
+    transaction.on_commit(start)
+
+
+@lru_cache(maxsize=None)
+def source_directories():
+    """Каталоги загрузок (upload_to) всех FileField проекта."""
+    return frozenset(
+        field.upload_to.strip('/').split('/')[0]
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+        and isinstance(field.upload_to, str) and field.upload_to.strip('/')
+    )
+
+
+def is_source(name):
+    """
+    name — оригинал из каталога загрузок, а не производная и не вариант.
+
+    Иначе из вариантов можно строить варианты вариантов, и кэш на диске
+    растёт без ограничений.
+    """
+    parts = name.split('/')
+    return (len(parts) > 1 and parts[0] in source_directories()
+            and DERIVATIVES_DIR not in parts)
+
+
+def resized_path(size, name):
+    """Путь варианта size ('ШxВ') файла name в кэше на диске."""
+    return os.path.join(settings.IMAGE_RESIZE_ROOT, size, name)
+
+
+def resize(storage, name, size):
+    """
+    Строит вариант изображения name размера size в кэше на диске.
+
+    Формат сохраняется по расширению, чтобы nginx отдавал готовый файл
+    с правильным типом. Запись атомарная: параллельный запрос увидит
+    либо готовый файл, либо его отсутствие.
+    """
+    target = resized_path(size, name)
+    if os.path.exists(target):
+        return target
+    image_format = Image.registered_extensions().get(
+        posixpath.splitext(name)[1].lower())
+    if image_format is None:
+        raise ValueError(f'Неизвестный формат: {name}')
+    width, height = (int(side) for side in size.split('x'))
+    with storage.open(name, 'rb') as source:
+        data = render(source.read(), {size: (width, height)},
+                      image_format)[size]
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp:
+        tmp.write(data)
+    os.replace(tmp.name, target)
+    return target
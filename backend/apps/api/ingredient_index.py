@@ -0,0 +1,216 @@
+import logging
+import threading
+from collections import Counter
+from heapq import nsmallest
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import (BooleanField, Case, FloatField, Q, Value,
+                              When)
+from django.db.models.expressions import RawSQL
+
+from apps.recipes import catalog as ingredient_catalog
+from apps.recipes.catalog import ORDERING, trigrams
+from .cache import ingredient_version
+
+# Порог похожести — как pg_trgm.similarity_threshold по умолчанию.
+TRIGRAM_THRESHOLD = 0.3
+# Короче трёх символов ищутся только начала названия и слов.
+INFIX_MIN_LENGTH = 3
+
+logger = logging.getLogger(__name__)
+
+
+def _similarity(common, first, second):
+    """Похожесть по числу общих триграмм, как similarity() в pg_trgm."""
+    total = first + second - common
+    return common / total if total else 0.0
+
+
+class IngredientIndex:
+    """
+    Поиск ингредиентов по файлу справочника (apps.recipes.catalog).
+
+    Ранг — позиция строки в порядке ORDERING, поэтому выдача по рангу
+    совпадает с ORM. Совпадения с префиксом — один отрезок порядка
+    по названию в нижнем регистре, нечёткий поиск идёт по обратному
+    индексу триграмм.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.version = catalog.stamp
+
+    def items(self):
+        return [self.catalog.item(rank) for rank in range(len(self.catalog))]
+
+    def search(self, prefix, limit=None):
+        """Ингредиенты, название которых начинается с prefix."""
+        if not prefix:
+            return self.items()
+        matches = self.catalog.prefix(prefix.lower())
+        if limit and len(matches) > limit:
+            ranks = nsmallest(limit, matches)
+        else:
+            ranks = sorted(matches)
+        return [self.catalog.item(rank) for rank in ranks]
+
+    def rank(self, query, limit=None):
+        """
+        Поиск с опечатками и по подстроке.
+
+        Сначала совпадения с началом названия, затем с началом слова
+        (после пробела), с подстрокой и нечёткие с похожестью не ниже
+        TRIGRAM_THRESHOLD; внутри группы — по убыванию похожести.
+        Группы, которые не попадут в первые limit, не ищутся.
+        """
+        catalog = self.catalog
+        query = query.lower()
+        grams = trigrams(query)
+        common = Counter()
+        for gram in grams:
+            common.update(catalog.postings(gram))
+        found = {}
+        for group, ranks in enumerate(self._groups(query)):
+            for rank in ranks:
+                if rank not in found:
+                    found[rank] = (group, -_similarity(
+                        common[rank], len(grams), catalog.gram_count(rank)))
+            if limit and len(found) >= limit:
+                # Следующие группы ниже уже найденных.
+                break
+
+        if len(query) >= INFIX_MIN_LENGTH and not (
+                limit and len(found) >= limit):
+            # Похожесть не выше common / len(grams).
+            least = TRIGRAM_THRESHOLD * len(grams)
+            for rank, count in common.items():
+                if count < least or rank in found:
+                    continue
+                score = _similarity(count, len(grams),
+                                    catalog.gram_count(rank))
+                if score >= TRIGRAM_THRESHOLD:
+                    found[rank] = (3, -score)
+
+        ranked = [(group, score, rank)
+                  for rank, (group, score) in found.items()]
+        if limit:
+            ranked = nsmallest(limit, ranked)
+        else:
+            ranked.sort()
+        return [catalog.item(rank) for _, _, rank in ranked]
+
+    def _groups(self, query):
+        """Ранги по группам: начало названия, начало слова, подстрока."""
+        catalog = self.catalog
+        yield catalog.prefix(query)
+        yield catalog.containing(f' {query}')
+        if len(query) >= INFIX_MIN_LENGTH:
+            yield catalog.containing(query)
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def _load(version):
+    """
+    Справочник нужной версии: общий файл, если он актуален.
+
+    Устаревший файл пересобирает один процесс; остальные в это время
+    обслуживает БД (None). Если файл записать нельзя, справочник
+    собирается в памяти процесса.
+    """
+    path = settings.INGREDIENT_CATALOG_PATH
+    catalog = ingredient_catalog.open_file(path)
+    if catalog is not None and catalog.stamp == version:
+        return catalog
+    try:
+        with ingredient_catalog.rebuild_lock(path) as acquired:
+            if not acquired:
+                return None
+            catalog = ingredient_catalog.open_file(path)
+            if catalog is None or catalog.stamp != version:
+                ingredient_catalog.write(path,
+                                         ingredient_catalog.build(version))
+                catalog = ingredient_catalog.open_file(path)
+            return catalog
+    except OSError:
+        logger.exception('Не удалось записать справочник %s', path)
+        return ingredient_catalog.Catalog(ingredient_catalog.build(version))
+
+
+def current():
+    """
+    Актуальный индекс процесса или None.
+
+    Устаревший индекс заменяется в этом же запросе; если его уже
+    заменяет другой поток или процесс, запрос обслуживает БД.
+    """
+    global _index
+
+    if not settings.INGREDIENT_INDEX:
+        return None
+    version = ingredient_version()
+    index = _index
+    if index is None or index.version != version:
+        if not _lock.acquire(blocking=False):
+            return None
+        try:
+            catalog = _load(version)
+            if catalog is None:
+                return None
+            index = _index = IngredientIndex(catalog)
+        finally:
+            _lock.release()
+    return index
+
+
+def catalog():
+    """Актуальный справочник для других модулей или None."""
+    index = current()
+    return None if index is None else index.catalog
+
+
+def lookup(prefix, limit=None):
+    """Ответ на ?name= из индекса или None, если индекса нет."""
+    index = current()
+    return None if index is None else index.search(prefix, limit)
+
+
+def lookup_ranked(query, limit=None):
+    """Ответ на ?search= из индекса или None, если индекса нет."""
+    index = current()
+    return None if index is None else index.rank(query, limit)
+
+
+def ranked(queryset, query):
+    """
+    Ранжирование rank() запросом к БД, когда индекса процесса нет.
+
+    Нечёткие совпадения ищутся только в PostgreSQL (pg_trgm, индекс
+    ingredient_name_trgm_idx); в других СУБД — три первые группы.
+    """
+    query = query.lower()
+    condition = (Q(name__istartswith=query)
+                 | Q(name__icontains=f' {query}'))
+    groups = [When(name__istartswith=query, then=Value(0)),
+              When(name__icontains=f' {query}', then=Value(1))]
+    score = Value(0.0)
+    if len(query) >= INFIX_MIN_LENGTH:
+        condition |= Q(name__icontains=query)
+        groups.append(When(name__icontains=query, then=Value(2)))
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            # То же выражение, что в индексе и в icontains Django.
+            column = 'UPPER({}.{}::text)'.format(
+                connection.ops.quote_name(queryset.model._meta.db_table),
+                connection.ops.quote_name('name'))
+            condition |= Q(RawSQL(f'{column} %% %s', (query,),
+                                  output_field=BooleanField()))
+            score = RawSQL(f'similarity({column}, %s)', (query,),
+                           output_field=FloatField())
+    return (queryset.filter(condition)
+            .annotate(search_group=Case(*groups, default=Value(3)),
+                      search_score=score)
+            .order_by('search_group', '-search_score', *ORDERING))
@@ -1,7 +1,201 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     """Пагинация."""
     page_size = 6
     page_size_query_param = 'limit'
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк по плану запроса PostgreSQL.
+
+    На других СУБД (SQLite в локальной разработке) считает точно.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset-пагинация (курсор) по полям ordering.
+
+    Страница выбирается условием по ключу последней строки вместо OFFSET,
+    поэтому глубокие страницы не дороже первой. COUNT(*) по умолчанию
+    не выполняется: ?count=exact считает точно, ?count=estimate берёт
+    оценку планировщика.
+    """
+    ordering = ('-pub_date', '-id')
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Страница queryset или слияние нескольких queryset.
+
+        Список queryset сливается в одну выдачу: из каждого берётся
+        не больше страницы строк. Для слияния все поля ordering должны
+        идти в одном направлении.
+        """
+        sources = (list(queryset) if isinstance(queryset, (list, tuple))
+                   else [queryset])
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request, sources[0].model)
+        counts = [self.get_count(source, request) for source in sources]
+        self.count = None if None in counts else sum(counts)
+
+        rows = []
+        for source in sources:
+            source = source.order_by(*self._ordering(reverse))
+            if position is not None:
+                source = source.filter(self._after(position, reverse))
+            rows.extend(source[:self.page_size + 1])
+        if len(sources) > 1:
+            descending = self.ordering[0].startswith('-') != reverse
+            rows.sort(key=self._position, reverse=descending)
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous = position is not None
+            self.has_next = has_more
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        return None
+
+    def _fields(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def _ordering(self, reverse):
+        if not reverse:
+            return self.ordering
+        return [field[1:] if field.startswith('-') else f'-{field}'
+                for field in self.ordering]
+
+    def _after(self, position, reverse):
+        """Условие «строго после position» в порядке выдачи."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def _position(self, row):
+        if isinstance(row, dict):
+            return [row[name] for name in self._fields()]
+        return [getattr(row, name) for name in self._fields()]
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            reverse = bool(payload['r'])
+            position = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self._fields(), payload['p'],
+                                       strict=True)
+            ]
+        except Exception as error:
+            raise NotFound(self.invalid_cursor_message) from error
+        return position, reverse
+
+    def encode_cursor(self, row, reverse):
+        # isoformat() без округления: ключ должен совпадать с БД точно.
+        position = [value.isoformat() if hasattr(value, 'isoformat')
+                    else value for value in self._position(row)]
+        payload = json.dumps({'p': position, 'r': int(reverse)})
+        encoded = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url,
+                                   self.cursor_query_param,
+                                   encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True,
+                         'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True,
+                             'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class RecipeCursorPagination(KeysetPagination):
+    """Курсорная пагинация ленты рецептов по индексу -pub_date."""
+    ordering = ('-pub_date', '-id')
+
+
+class FeedPagination(KeysetPagination):
+    """Курсорная пагинация ленты подписок."""
+    ordering = ('-pub_date', '-recipe_id')
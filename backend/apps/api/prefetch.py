@@ -0,0 +1,120 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              Value, prefetch_related_objects)
+from rest_framework import serializers
+
+
+def user_relation(model, lookup):
+    """
+    Аннотация «объект связан с текущим пользователем».
+
+    Возвращает фабрику, которая по пользователю строит Exists-подзапрос
+    к model (Favorite, ShoppingCart, Follow) или False для анонима.
+    """
+
+    def annotation(user):
+        if not user or not user.is_authenticated:
+            return Value(False, output_field=BooleanField())
+        return Exists(model.objects.filter(user=user,
+                                           **{lookup: OuterRef('pk')}))
+
+    return annotation
+
+
+def _forward_path(model, attrs):
+    """Цепочка прямых FK из source поля, пригодная для select_related."""
+    path = []
+    for attr in attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            break
+        if not (field.is_relation and field.concrete
+                and (field.many_to_one or field.one_to_one)):
+            break
+        path.append(attr)
+        model = field.related_model
+    return '__'.join(path)
+
+
+class QueryPlan:
+    """
+    План загрузки данных для сериализатора.
+
+    Обходит дерево полей сериализатора и собирает select_related,
+    prefetch_related и аннотации (Meta.annotations), чтобы страница
+    любого размера загружалась фиксированным числом запросов.
+    """
+
+    def __init__(self, serializer, model=None):
+        self.model = model or serializer.Meta.model
+        self.select = set()
+        self.prefetch = []
+        self.annotations = {}
+
+        request = serializer.context.get('request')
+        user = getattr(request, 'user', None)
+        meta = getattr(serializer, 'Meta', None)
+        for name, factory in getattr(meta, 'annotations', {}).items():
+            self.annotations[name] = factory(user)
+
+        for field in serializer.fields.values():
+            if field.write_only or field.source == '*':
+                continue
+            self._add_field(field)
+
+    def _add_field(self, field):
+        attrs = field.source_attrs
+        if isinstance(field, serializers.ListSerializer):
+            related = self._related_model(attrs[0])
+            if related is not None:
+                child = QueryPlan(field.child, related)
+                self.prefetch.append(
+                    Prefetch(attrs[0],
+                             queryset=child.apply(
+                                 related._default_manager.all())))
+            return
+
+        path = _forward_path(self.model, attrs)
+        if not path:
+            return
+        if isinstance(field, serializers.BaseSerializer):
+            related = self._related_model(attrs[0])
+            child = QueryPlan(field, related)
+            if child.annotations or child.prefetch:
+                self.prefetch.append(
+                    Prefetch(path,
+                             queryset=child.apply(
+                                 related._default_manager.all())))
+                return
+            self.select.update(f'{path}__{lookup}'
+                               for lookup in child.select)
+        self.select.add(path)
+
+    def _related_model(self, attr):
+        try:
+            field = self.model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        return field.related_model if field.is_relation else None
+
+    def annotate(self, queryset):
+        """Добавляет только аннотации верхнего уровня."""
+        if self.annotations:
+            queryset = queryset.annotate(**self.annotations)
+        return queryset
+
+    def apply(self, queryset):
+        """Дополняет queryset всем, что нужно сериализатору."""
+        queryset = self.annotate(queryset)
+        if self.select:
+            queryset = queryset.select_related(*sorted(self.select))
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*self.prefetch)
+        return queryset
+
+    def prefetch_objects(self, instances):
+        """Догружает связи для уже полученных объектов."""
+        prefetch_related_objects(instances,
+                                 *sorted(self.select),
+                                 *self.prefetch)
@@ -0,0 +1,52 @@
+from django.db.models.fields.files import FieldFile
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ProjectJSONEncoder(JSONEncoder):
+    """
+    JSONEncoder DRF, который понимает и файлы моделей.
+
+    Даты, Decimal и ленивые строки (русские сообщения об ошибках)
+    обрабатывает родительский класс; FieldFile превращается в URL.
+    """
+
+    def default(self, obj):
+        if isinstance(obj, FieldFile):
+            return obj.url if obj else None
+        return super().default(obj)
+
+
+_default = ProjectJSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson, если он установлен.
+
+    Вывод совпадает с JSONRenderer: компактный, UTF-8, даты в формате
+    DRF (orjson отдаёт их в _default), U+2028/U+2029 экранированы.
+    Отступы (?indent, Browsable API) и отсутствие orjson — путь
+    родительского класса.
+    """
+    encoder_class = ProjectJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        ret = orjson.dumps(data, default=_default,
+                           option=orjson.OPT_PASSTHROUGH_DATETIME
+                           | orjson.OPT_NON_STR_KEYS)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+                b'\xe2\x80\xa9', b'\\u2029')
+        return ret
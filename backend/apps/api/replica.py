@@ -0,0 +1,97 @@
+import hashlib
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_KEY = 'replica-pin:{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_alias():
+    """Псевдоним реплики, если она настроена."""
+    alias = settings.REPLICA_DATABASE
+    return alias if alias in settings.DATABASES else None
+
+
+def _pin_key(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    return PIN_KEY.format(hashlib.sha256(authorization.encode()).hexdigest())
+
+
+def _replica_action(request, view_func):
+    actions = getattr(view_func, 'actions', None)
+    if request.method not in SAFE_METHODS or not actions:
+        return False
+    action = actions.get(request.method.lower())
+    return action in getattr(view_func.cls, 'replica_actions', ())
+
+
+class ReplicaRouter:
+    """
+    Чтение моделей REPLICA_APPS с реплики внутри запросов, которые
+    разрешил ReplicaMiddleware. Запись, транзакции и остальные модели
+    (токены, сессии) — всегда основная БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if (alias is None or not _use_replica.get()
+                or model._meta.app_label not in settings.REPLICA_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На реплике те же данные, что и в основной БД.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплики приходит репликацией.
+        return db != replica_alias()
+
+
+class ReplicaMiddleware:
+    """
+    Направляет на реплику безопасные запросы к действиям из
+    replica_actions вьюсета.
+
+    Клиент, который только что что-то изменил, REPLICA_PIN_SECONDS
+    читает из основной БД, чтобы видеть свои записи несмотря на
+    отставание реплики. Клиент определяется по заголовку Authorization.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _use_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        if (request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and replica_alias() is not None):
+            key = _pin_key(request)
+            if key:
+                cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if replica_alias() is None or not _replica_action(request,
+                                                          view_func):
+            return None
+        key = _pin_key(request)
+        if key and cache.get(key):
+            return None
+        _use_replica.set(True)
+        return None
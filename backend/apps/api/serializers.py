@@ -1,9 +1,13 @@
+import json
+
 from rest_framework import serializers
-from rest_framework.exceptions import ValidationError
+from rest_framework.utils import html
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from djoser.serializers import (UserSerializer as BaseUserSerializer,
                                 UserCreateSerializer)
 
+from apps.recipes import feed, shopping_list
 from apps.recipes.models import (Tag,
                                  Ingredient,
                                  Recipe,
@@ -11,7 +15,10 @@ from apps.recipes.models import (Tag,
                                  Favorite,
                                  ShoppingCart)
 from apps.users.models import Follow
-from .fields import Base64ImageField
+from .cache import bump_recipe
+from .fields import Base64ImageField, SizedImageField, image_size
+from .prefetch import user_relation
+from .subscriptions import get_resolver
 
 
 User = get_user_model()
@@ -63,7 +70,20 @@ class UserCreateSerializer(UserCreateSerializer):
         }
 
 
+class UserListSerializer(serializers.ListSerializer):
+    """Заранее сообщает резолверу подписок всех пользователей списка."""
+
+    def to_representation(self, data):
+        users = data.all() if hasattr(data, 'all') else data
+        users = list(users)
+        get_resolver(self.context.get('request')).prime(
+            user.pk for user in users
+            if not hasattr(user, 'is_subscribed'))
+        return super().to_representation(users)
+
+
 class UserReadSerializer(BaseUserSerializer):
+    avatar = SizedImageField(required=False, allow_null=True)
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta(BaseUserSerializer.Meta):
@@ -75,14 +95,13 @@ class UserReadSerializer(BaseUserSerializer):
                   'last_name',
                   'avatar',
                   'is_subscribed')
+        list_serializer_class = UserListSerializer
 
     def get_is_subscribed(self, author):
-        request = self.context.get('request')
-        user = getattr(request, 'user', None)
-        return (
-            user
-            and user.is_authenticated
-            and author.following.filter(user_id=user.pk).exists()) or False
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
+        return get_resolver(self.context.get('request')).is_subscribed(
+            author.pk)
 
 
 class AvatarSerializer(serializers.ModelSerializer):
@@ -100,7 +119,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         source='recipe_ingredients',
         many=True
     )
-    image = serializers.ImageField(read_only=True)
+    image = SizedImageField(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -118,12 +137,18 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'text',
             'cooking_time',
         )
+        annotations = {
+            'is_favorited': user_relation(Favorite, 'recipe'),
+            'is_in_shopping_cart': user_relation(ShoppingCart, 'recipe'),
+        }
 
     def _get_user(self):
         request = self.context.get('request')
         return getattr(request, 'user', None) if request else None
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         request = self.context.get('request')
         user = getattr(request, 'user', None)
         if not user or not user.is_authenticated:
@@ -131,6 +156,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         return recipe.in_favorites.filter(user=user).exists()
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         request = self.context.get('request')
         user = getattr(request, 'user', None)
         if not user or not user.is_authenticated:
@@ -161,6 +188,29 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             'tags': {'allow_empty': False},
         }
 
+    def to_internal_value(self, data):
+        if html.is_html_input(data):
+            data = self._form_data(data)
+        return super().to_internal_value(data)
+
+    def _form_data(self, data):
+        """
+        Данные multipart-формы в виде, как у JSON-запроса.
+
+        tags передаются повторяющимся полем, ingredients — JSON-строкой.
+        """
+        result = data.dict()
+        if 'tags' in data:
+            result['tags'] = data.getlist('tags')
+        if 'ingredients' in data:
+            try:
+                result['ingredients'] = json.loads(data['ingredients'])
+            except (TypeError, ValueError):
+                raise serializers.ValidationError({
+                    'ingredients': 'Ожидается JSON-список ингредиентов.'
+                })
+        return result
+
     def validate(self, attrs):
         ingredients = attrs.get('ingredients') or []
 
@@ -211,60 +261,85 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             })
         return attrs
 
-    def _set_m2m(self, recipe, tags, ingredients):
-        recipe.tags.set(tags)
-        recipe.recipe_ingredients.all().delete()
-        ing_map = {
-            ingredient.id: ingredient
-            for ingredient in Ingredient.objects.filter(
-                id__in=[item['id'] for item in ingredients]
-            )
-        }
-        recipe_ingredients = []
-        for item in ingredients:
-            ingredient = ing_map[item['id']]
-            recipe_ingredients.append(
-                RecipeIngredient(
-                    recipe=recipe,
-                    ingredient=ingredient,
-                    amount=item['amount'],
-                ))
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
-
+    def _set_ingredients(self, recipe, ingredients):
+        """
+        Приводит состав рецепта к ingredients минимальным набором запросов.
+
+        Сравнивает с текущими строками и выполняет только нужные
+        DELETE, UPDATE и INSERT. Существование ингредиентов уже
+        проверено в validate, поэтому строки создаются по id.
+
+        Состав читается по возрастанию id (Meta.ordering RecipeIngredient),
+        поэтому строки хранятся в присланном порядке: если оставшиеся
+        ингредиенты переставлены или новые стоят не в конце, состав
+        записывается заново.
+        """
+        current = {row.ingredient_id: row
+                   for row in recipe.recipe_ingredients.all()}
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        old_amounts = {ingredient_id: row.amount
+                       for ingredient_id, row in current.items()}
+
+        kept = [ingredient_id for ingredient_id in
+                sorted(current, key=lambda key: current[key].pk)
+                if ingredient_id in amounts]
+        reordered = list(amounts)[:len(kept)] != kept
+
+        removed = [row.pk for ingredient_id, row in current.items()
+                   if reordered or ingredient_id not in amounts]
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if (not reordered and amount is not None
+                    and amount != row.amount):
+                row.amount = amount
+                changed.append(row)
+        added = [RecipeIngredient(recipe=recipe,
+                                  ingredient_id=ingredient_id,
+                                  amount=amount)
+                 for ingredient_id, amount in amounts.items()
+                 if reordered or ingredient_id not in current]
+
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        if removed or changed or added:
+            # bulk_update и bulk_create не отправляют post_save —
+            # версию фрагмента меняем явно.
+            bump_recipe(recipe.pk)
+            shopping_list.recipe_changed(recipe.pk, old_amounts, amounts)
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         author = self.context['request'].user
         data = dict(validated_data, author=author)
         recipe = Recipe.objects.create(**data)
-        self._set_m2m(recipe, tags, ingredients)
+        recipe.tags.set(tags)
+        # Новый рецепт не лежит ни в корзинах, ни в кэше фрагментов:
+        # сравнивать не с чем, строки состава просто вставляются.
+        RecipeIngredient.objects.bulk_create(
+            [RecipeIngredient(recipe=recipe,
+                              ingredient_id=item['id'],
+                              amount=item['amount'])
+             for item in ingredients])
+        feed.fan_out(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         instance = super().update(instance, validated_data)
-
-        if tags is None and ingredients is None:
-            return
-        if tags is None:
-            tags_data = instance.tags.all()
-        else:
-            tags_data = tags
-        tags_data = (
-            [tag.slug for tag in instance.tags.all()]
-            if tags is None
-            else tags)
-
-        if ingredients is None:
-            ingredients_data = [
-                {'id': ri.ingredient_id, 'amount': ri.amount}
-                for ri in instance.recipe_ingredients.all()
-            ]
-        else:
-            ingredients_data = ingredients
-
-        self._set_m2m(instance, tags_data, ingredients_data)
+        # tags.set() сам сравнивает с текущими тегами.
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self._set_ingredients(instance, ingredients)
         return instance
 
     def to_representation(self, instance):
@@ -281,46 +356,26 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Сериализатор для списка избранного."""
-
-    class Meta:
-        model = Favorite
-        fields = ('recipe',)
-
-    def validate(self, attrs):
-        user = self.context['request'].user
-        recipe = attrs['recipe']
-
-        if Favorite.objects.filter(user=user, recipe=recipe).exists():
-            raise ValidationError({'detail': 'Рецепт уже в избранном.'})
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных операций."""
 
-        return attrs
-
-    def create(self, validated_data):
-        user = self.context['request'].user
-        return Favorite.objects.create(user=user, **validated_data)
-
-
-class ShoppingCartSerializer(FavoriteSerializer):
-    """Сериализатор для списка покупок."""
-
-    class Meta:
-        model = ShoppingCart
-        fields = ('recipe',)
-
-    def validate(self, attrs):
-        user = self.context['request'].user
-        recipe = attrs['recipe']
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
 
-        if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-            raise ValidationError({'detail': 'Рецепт уже в списке покупок.'})
+    def validate_recipes(self, recipes):
+        return list(dict.fromkeys(recipes))
 
-        return attrs
 
-    def create(self, validated_data):
-        user = self.context['request'].user
-        return ShoppingCart.objects.create(user=user, **validated_data)
+def recipes_limit(request):
+    """Значение ?recipes_limit или None, если не задано или некорректно."""
+    try:
+        limit = int(request.query_params.get('recipes_limit'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return limit if limit >= 0 else None
 
 
 class FollowReadSerializer(serializers.ModelSerializer):
@@ -329,14 +384,11 @@ class FollowReadSerializer(serializers.ModelSerializer):
     username = serializers.ReadOnlyField(source='author.username')
     first_name = serializers.ReadOnlyField(source='author.first_name')
     last_name = serializers.ReadOnlyField(source='author.last_name')
-    avatar = serializers.ImageField(source='author.avatar', read_only=True)
+    avatar = SizedImageField(source='author.avatar', read_only=True)
 
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='author.recipes.count',
-        read_only=True,
-    )
+    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Follow
@@ -352,25 +404,30 @@ class FollowReadSerializer(serializers.ModelSerializer):
                   )
 
     def get_is_subscribed(self, follow):
+        # Сериализуются подписки текущего пользователя — запрос не нужен.
         request = self.context.get('request')
-        user = request.user
-        author = follow.author
-        return (
-            user and user.is_authenticated
-            and author.following.filter(user=user).exists()
-        )
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_authenticated
+                    and follow.user_id == user.pk)
 
     def get_recipes(self, follow):
-        request = self.context.get('request')
-        queryset = follow.author.recipes.all()
-
-        try:
-            limit = int(request.query_params.get('recipes_limit'))
-            queryset = queryset[:limit]
-        except (TypeError, ValueError):
-            pass
-
-        return RecipeShortSerializer(queryset, many=True).data
+        author = follow.author
+        if hasattr(author, 'recipes_preview'):
+            recipes = author.recipes_preview
+        else:
+            recipes = author.recipes.all()
+            limit = recipes_limit(self.context.get('request'))
+            if limit is not None:
+                recipes = recipes[:limit]
+
+        return RecipeShortSerializer(
+            recipes, many=True,
+            context={'image_size': image_size(self.context)}).data
+
+    def get_recipes_count(self, follow):
+        if hasattr(follow, 'recipes_count'):
+            return follow.recipes_count
+        return follow.author.recipes.count()
 
 
 class FollowCreateSerializer(serializers.ModelSerializer):
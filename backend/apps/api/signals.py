@@ -0,0 +1,143 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from apps.recipes.models import (Ingredient,
+                                 Recipe,
+                                 RecipeIngredient,
+                                 RecipeTag,
+                                 Tag)
+from . import images
+from .authentication import token_cache
+from .cache import (bump_author, bump_catalog, bump_ingredients,
+                    bump_recipe)
+
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_recipe(instance.pk)
+
+
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_relation_changed(sender, instance, **kwargs):
+    bump_recipe(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_recipe(instance.pk)
+    elif pk_set is None:
+        bump_catalog()
+    else:
+        for recipe_id in pk_set:
+            bump_recipe(recipe_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalog_changed(sender, **kwargs):
+    bump_catalog()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    bump_ingredients()
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    # Вход в систему обновляет только last_login — фрагменты не меняются.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_author(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # Выход через auth/token/logout/ удаляет токен.
+    key, user_id = instance.key, instance.user_id
+    transaction.on_commit(lambda: token_cache.evict([key], user_id=user_id))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # Смена пароля, блокировка и правки профиля: снимок устарел.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    keys = []
+    if settings.TOKEN_CACHE_SHARED_TTL:
+        keys = list(Token.objects.filter(user_id=instance.pk)
+                    .values_list('key', flat=True))
+    user_id = instance.pk
+    transaction.on_commit(
+        lambda: token_cache.evict(keys, user_id=user_id))
+
+
+def _image_saved(field_file, update_fields, raw, on_ready):
+    if raw:
+        return
+    if update_fields is None or field_file.field.name in update_fields:
+        images.schedule(field_file, on_ready)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, update_fields=None, raw=False,
+                       **kwargs):
+    # Готовые производные меняют ссылки во фрагментах — сбрасываем их.
+    _image_saved(instance.image, update_fields, raw,
+                 partial(bump_recipe, instance.pk))
+
+
+@receiver(post_save, sender=User)
+def avatar_saved(sender, instance, update_fields=None, raw=False, **kwargs):
+    _image_saved(instance.avatar, update_fields, raw,
+                 partial(bump_author, instance.pk))
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def image_replaced(sender, instance, raw=False, **kwargs):
+    # Старый файл освобождается после коммита: хранилище удалит его,
+    # если на него больше никто не ссылается.
+    if raw or instance.pk is None:
+        return
+    for field_file in _field_files(instance):
+        if not field_file or field_file._committed:
+            continue
+        old = (sender._default_manager.filter(pk=instance.pk)
+               .values_list(field_file.field.attname, flat=True).first())
+        if old:
+            field_file.storage.delete(old)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def image_owner_deleted(sender, instance, **kwargs):
+    for field_file in _field_files(instance):
+        if field_file:
+            field_file.storage.delete(field_file.name)
+
+
+def _field_files(instance):
+    return [getattr(instance, field.attname)
+            for field in instance._meta.concrete_fields
+            if isinstance(field, models.FileField)]
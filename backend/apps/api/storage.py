@@ -0,0 +1,162 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+import time
+from contextlib import suppress
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import locks
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+
+from .images import DERIVATIVES_DIR, derivative_name, resized_path
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла — sha256 его содержимого.
+
+    recipes/<uuid>.jpg сохраняется как recipes/ab/abcd….jpg; если такой
+    файл уже есть, запись пропускается. Файл удаляется, только когда
+    на него не ссылается ни одна строка БД.
+
+    Запись атомарная: файл пишется во временный и появляется под своим
+    именем целиком. Если то же имя параллельно записал другой процесс,
+    используется его файл — содержимое то же.
+    """
+
+    def _hash(self, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _is_derivative(name):
+        # Имена производных строятся из имени оригинала и уже
+        # определяются содержимым.
+        return DERIVATIVES_DIR in name.split('/')
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя означает одинаковое содержимое.
+        return name
+
+    def _save(self, name, content):
+        # FileSystemStorage._save при занятом имени спрашивает новое
+        # у get_available_name и при одинаковом ответе зацикливается,
+        # поэтому файл пишется здесь.
+        if self._is_derivative(name):
+            self._write(name, content, replace=True)
+            return name
+        directory, filename = posixpath.split(name)
+        digest = self._hash(content)
+        extension = posixpath.splitext(filename)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest + extension)
+        if not self._touch(name):
+            self._write(name, content, replace=False)
+        return name
+
+    def _write(self, name, content, replace):
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, prefix='.tmp-',
+                                         delete=False) as tmp:
+            for chunk in content.chunks():
+                tmp.write(chunk)
+        try:
+            os.chmod(tmp.name, self.file_permissions_mode or 0o644)
+            if replace:
+                os.replace(tmp.name, path)
+            else:
+                # link не заменяет существующий файл: кто успел первым,
+                # тот и записал.
+                with suppress(FileExistsError):
+                    os.link(tmp.name, path)
+        finally:
+            with suppress(FileNotFoundError):
+                os.remove(tmp.name)
+
+    def _touch(self, name):
+        """
+        Обновляет mtime существующего файла под разделяемой блокировкой;
+        False, если файла нет или release удалил его, пока ждали.
+        """
+        try:
+            file = open(self.path(name), 'rb')
+        except FileNotFoundError:
+            return False
+        with file:
+            locks.lock(file, locks.LOCK_SH)
+            try:
+                if os.fstat(file.fileno()).st_nlink == 0:
+                    return False
+                os.utime(file.fileno())
+            finally:
+                locks.unlock(file)
+        return True
+
+    def delete(self, name):
+        """Удаление после коммита и только если файл больше не нужен."""
+        if not name or self._is_derivative(name):
+            return super().delete(name)
+        transaction.on_commit(lambda: self.release(name))
+
+    def references(self, name):
+        """Число строк, ссылающихся на файл, по всем FileField."""
+        return sum(
+            model._default_manager.filter(**{field.name: name}).count()
+            for model, field in self._fields()
+        )
+
+    def referenced(self):
+        """Имена всех файлов хранилища, на которые ссылается БД."""
+        names = set()
+        for model, field in self._fields():
+            names.update(model._default_manager
+                         .exclude(**{field.name: ''})
+                         .values_list(field.name, flat=True))
+        return names
+
+    def _fields(self):
+        for model in apps.get_models():
+            for field in model._meta.concrete_fields:
+                if (isinstance(field, models.FileField)
+                        and isinstance(field.storage, type(self))):
+                    yield model, field
+
+    def release(self, name):
+        """
+        Удаляет файл, производные и варианты, если ссылок на него нет.
+
+        Запрос, который только что переиспользовал файл, ещё не закоммичен
+        и в ссылках не виден, но уже обновил mtime (_touch). Поэтому файлы
+        моложе IMAGE_RELEASE_GRACE не удаляются — их подберёт
+        prune_images, — а проверка и удаление идут под исключительной
+        блокировкой файла.
+        """
+        if not name or self._is_derivative(name) or self.references(name):
+            return False
+        try:
+            file = open(self.path(name), 'rb')
+        except FileNotFoundError:
+            return False
+        with file:
+            locks.lock(file, locks.LOCK_EX)
+            try:
+                stat = os.fstat(file.fileno())
+                if (stat.st_nlink == 0 or time.time() - stat.st_mtime
+                        < settings.IMAGE_RELEASE_GRACE):
+                    return False
+                for size in settings.IMAGE_DERIVATIVES:
+                    super().delete(derivative_name(name, size))
+                for size in settings.IMAGE_RESIZE_SIZES:
+                    with suppress(FileNotFoundError):
+                        os.remove(resized_path(size, name))
+                super().delete(name)
+            finally:
+                locks.unlock(file)
+        return True
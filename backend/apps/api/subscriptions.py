@@ -0,0 +1,59 @@
+from apps.users.models import Follow
+
+
+class SubscriptionResolver:
+    """
+    Подписки текущего пользователя на авторов в пределах одного запроса.
+
+    Сериализаторы сначала сообщают id всех авторов, которых будут
+    выводить (prime), и первый же вопрос is_subscribed отвечается
+    одним запросом к Follow на всех сразу. Ответы запоминаются.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.known = {}
+        self.pending = set()
+
+    @property
+    def active(self):
+        return bool(self.user and self.user.is_authenticated)
+
+    def prime(self, author_ids):
+        if self.active:
+            self.pending.update(author_id for author_id in author_ids
+                                if author_id not in self.known)
+
+    def is_subscribed(self, author_id):
+        # На себя подписаться нельзя (ограничение no_self_follow).
+        if not self.active or author_id == self.user.pk:
+            return False
+        if author_id not in self.known:
+            self.pending.add(author_id)
+            self._resolve()
+        return self.known[author_id]
+
+    def _resolve(self):
+        author_ids, self.pending = self.pending, set()
+        followed = set(
+            Follow.objects
+            .filter(user=self.user, author_id__in=author_ids)
+            .values_list('author_id', flat=True)
+        )
+        for author_id in author_ids:
+            self.known[author_id] = author_id in followed
+
+
+def get_resolver(request):
+    """Резолвер, общий для всех сериализаторов запроса."""
+    if request is None:
+        return SubscriptionResolver(None)
+    # Храним на HttpRequest: DRF Request создаётся заново во вложенных
+    # вызовах, а исходный запрос один.
+    http_request = getattr(request, '_request', request)
+    user = getattr(request, 'user', None)
+    resolver = getattr(http_request, '_subscription_resolver', None)
+    if resolver is None or resolver.user != user:
+        resolver = SubscriptionResolver(user)
+        http_request._subscription_resolver = resolver
+    return resolver
@@ -0,0 +1,48 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from apps.recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+
+def png(color=(200, 80, 40), size=(32, 32)):
+    """PNG-изображение в памяти."""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def create_user(username, **fields):
+    return User.objects.create_user(username=username,
+                                    email=f'{username}@example.com',
+                                    password='password',
+                                    **fields)
+
+
+def create_tags(count):
+    return [Tag.objects.create(name=f'Тег {index}', slug=f'tag{index}')
+            for index in range(count)]
+
+
+def create_ingredients(count):
+    return Ingredient.objects.bulk_create(
+        [Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+         for index in range(count)])
+
+
+def create_recipe(author, tags=(), ingredients=(), name='Рецепт',
+                  image=None):
+    """Рецепт с тегами и ингредиентами [(ingredient, amount)]."""
+    recipe = Recipe(author=author, name=name, text='Описание',
+                    cooking_time=10)
+    recipe.image.save('recipe.png', ContentFile(image or png()), save=False)
+    recipe.save()
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        [RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+         for ingredient, amount in ingredients])
+    return recipe
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.api.authentication import TokenCache, restore, snapshot
+
+from .factories import create_user
+
+
+class TokenCacheTest(TestCase):
+    """Два экземпляра TokenCache — память двух воркеров."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+
+    def setUp(self):
+        cache.clear()
+        self.first, self.second = TokenCache(), TokenCache()
+
+    def assert_revoked_everywhere(self):
+        self.assertIsNotNone(self.second.get('key'))
+        self.first.evict(['key'], user_id=self.user.pk)
+        self.assertIsNone(self.first.get('key'))
+        self.assertIsNone(self.second.get('key'))
+
+    def test_evict_reaches_other_workers(self):
+        self.first.set('key', snapshot(self.user))
+        self.assert_revoked_everywhere()
+
+    @override_settings(TOKEN_CACHE_SHARED_TTL=0)
+    def test_evict_reaches_local_entries(self):
+        self.second.set('key', snapshot(self.user))
+        self.assert_revoked_everywhere()
+
+    def test_restored_user_keeps_last_login(self):
+        data = snapshot(self.user)
+        last_login = timezone.now() + timedelta(hours=1)
+        self.user.last_login = last_login
+        self.user.save(update_fields=['last_login'])
+
+        user = restore(data)
+        user.first_name = 'Имя'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, last_login)
+        self.assertEqual(self.user.first_name, 'Имя')
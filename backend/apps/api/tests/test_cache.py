@@ -0,0 +1,25 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from apps.api.cache import Counters
+
+
+@override_settings(TEST_STATS_EVERY=10)
+class CountersTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.counters = Counters(('test:hits', 'test:misses'),
+                                 'TEST_STATS_EVERY')
+
+    def test_writes_in_batches(self):
+        self.counters.add({'test:hits': 6, 'test:misses': 3})
+        self.assertIsNone(cache.get('test:hits'))
+        self.assertEqual(self.counters.totals(),
+                         {'test:hits': 6, 'test:misses': 3})
+
+        self.counters.add({'test:hits': 1, 'test:misses': 0})
+        self.assertEqual(cache.get_many(['test:hits', 'test:misses']),
+                         {'test:hits': 7, 'test:misses': 3})
+        self.assertEqual(self.counters.totals(),
+                         {'test:hits': 7, 'test:misses': 3})
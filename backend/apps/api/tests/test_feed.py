@@ -0,0 +1,32 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from apps.recipes.feed import popular_authors
+from apps.users.models import Follow
+
+from .factories import create_user
+
+
+@override_settings(FEED_FANOUT_LIMIT=1)
+class PopularAuthorsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.popular = create_user('popular')
+        cls.author = create_user('author')
+        cls.readers = [create_user(f'reader{index}') for index in range(2)]
+        Follow.objects.bulk_create(
+            [Follow(user=reader, author=cls.popular)
+             for reader in cls.readers]
+            + [Follow(user=cls.readers[0], author=cls.author)])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_followers_once_per_ttl(self):
+        reader = self.readers[0]
+        with self.assertNumQueries(2):
+            self.assertEqual(popular_authors(reader), [self.popular.pk])
+        # Список популярных авторов уже в кэше: остаётся выборка подписок.
+        with self.assertNumQueries(1):
+            self.assertEqual(popular_authors(reader), [self.popular.pk])
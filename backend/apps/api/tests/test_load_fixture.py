@@ -0,0 +1,32 @@
+import io
+import tempfile
+
+from django.core import serializers
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from apps.api.authentication import TokenCache, snapshot
+
+from .factories import create_user
+
+
+class LoadFixtureTokensTest(TestCase):
+
+    def test_loaded_users_evicted_in_other_workers(self):
+        cache.clear()
+        user = create_user('reader')
+        token = Token.objects.create(user=user)
+        # Снимок в памяти другого воркера.
+        worker = TokenCache()
+        worker.set(token.key, snapshot(user))
+
+        user.first_name = 'Имя'
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as fixture:
+            fixture.write(serializers.serialize('json', [user]))
+            fixture.flush()
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('load_fixture', fixture.name,
+                             stdout=io.StringIO())
+        self.assertIsNone(worker.get(token.key))
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.recipes.models import Recipe
+
+from .factories import create_recipe, create_user
+
+
+class RecipeCursorPaginationTest(TestCase):
+    """?pagination=cursor: keyset по (-pub_date, -id)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        recipes = [create_recipe(author, name=f'Рецепт {index}')
+                   for index in range(7)]
+        # Группы рецептов с одинаковым pub_date: порядок внутри группы
+        # решает id.
+        now = timezone.now()
+        for index, recipe in enumerate(recipes):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timedelta(minutes=index // 3))
+        cls.expected = list(Recipe.objects.order_by('-pub_date', '-id')
+                            .values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def ids(self, page):
+        return [recipe['id'] for recipe in page['results']]
+
+    def test_forward_and_backward(self):
+        page = self.get('/api/recipes/', {'pagination': 'cursor',
+                                          'limit': 2})
+        self.assertIsNone(page['previous'])
+        pages = [self.ids(page)]
+        while page['next']:
+            page = self.get(page['next'])
+            pages.append(self.ids(page))
+        self.assertEqual([len(ids) for ids in pages], [2, 2, 2, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        backward = [self.ids(page)]
+        while page['previous']:
+            page = self.get(page['previous'])
+            backward.append(self.ids(page))
+        self.assertEqual(backward[::-1], pages)
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', 'eyJwIjogWzFdLCAiciI6IDB9'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/recipes/', {
+                    'pagination': 'cursor', 'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_count(self):
+        params = {'pagination': 'cursor', 'limit': 2}
+        self.assertIsNone(self.get('/api/recipes/', params)['count'])
+        for mode in ('exact', 'estimate'):
+            with self.subTest(count=mode):
+                page = self.get('/api/recipes/', {**params, 'count': mode})
+                # На SQLite оценка совпадает с точным числом.
+                self.assertEqual(page['count'], len(self.expected))
+
+    def test_page_number_by_default(self):
+        page = self.get('/api/recipes/', {'limit': 3, 'page': 2})
+        self.assertEqual(list(page),
+                         ['count', 'next', 'previous', 'results'])
+        self.assertEqual(page['count'], len(self.expected))
+        self.assertIn('page=3', page['next'])
+        self.assertNotIn('cursor', page['next'])
+        # Порядок Meta.ordering модели, как до курсорной пагинации.
+        self.assertEqual(
+            self.ids(page),
+            list(Recipe.objects.values_list('id', flat=True)[3:6]))
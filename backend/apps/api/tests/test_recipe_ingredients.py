@@ -0,0 +1,88 @@
+import base64
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .factories import (create_ingredients, create_recipe, create_tags,
+                        create_user, png)
+
+
+class RecipeIngredientOrderTest(TestCase):
+    """Состав рецепта отдаётся в том порядке, в котором его прислали."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.tags = create_tags(1)
+        cls.ingredients = create_ingredients(4)
+        cls.recipe = create_recipe(
+            cls.author, tags=cls.tags,
+            ingredients=[(ingredient, 10)
+                         for ingredient in cls.ingredients[:3]])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def update(self, ingredients):
+        # Версии кэша фрагментов меняются в on_commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/',
+                {'tags': [tag.pk for tag in self.tags],
+                 'ingredients': [{'id': ingredient.pk, 'amount': amount}
+                                 for ingredient, amount in ingredients]},
+                format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        return [(item['id'], item['amount'])
+                for item in response.json()['ingredients']]
+
+    def test_keeps_submitted_order(self):
+        first, second, third, fourth = self.ingredients
+        cases = (
+            # Изменено количество, новый ингредиент — в конце.
+            [(first, 10), (second, 20), (third, 10), (fourth, 5)],
+            # Удалён ингредиент из середины.
+            [(first, 10), (third, 10), (fourth, 5)],
+            # Перестановка и вставка в начало.
+            [(second, 1), (fourth, 5), (first, 10)],
+        )
+        for ingredients in cases:
+            with self.subTest(ingredients=ingredients):
+                self.assertEqual(
+                    self.update(ingredients),
+                    [(ingredient.pk, amount)
+                     for ingredient, amount in ingredients])
+
+    def test_list_keeps_stored_order(self):
+        first, second, third, fourth = self.ingredients
+        ingredients = [(fourth, 1), (first, 2), (third, 3)]
+        self.update(ingredients)
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(
+            [(item['id'], item['amount'])
+             for item in response.json()['results'][0]['ingredients']],
+            [(ingredient.pk, amount) for ingredient, amount in ingredients])
+
+    def test_create_skips_diff_side_effects(self):
+        third, first = self.ingredients[2], self.ingredients[0]
+        image = base64.b64encode(png()).decode()
+        with mock.patch('apps.api.serializers.bump_recipe') as bump, \
+                mock.patch('apps.api.serializers.shopping_list') as carts:
+            response = self.client.post('/api/recipes/', {
+                'name': 'Новый', 'text': 'Описание', 'cooking_time': 5,
+                'image': f'data:image/png;base64,{image}',
+                'tags': [tag.pk for tag in self.tags],
+                'ingredients': [{'id': third.pk, 'amount': 2},
+                                {'id': first.pk, 'amount': 1}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        # Новый рецепт не может быть ни в корзинах, ни в кэше фрагментов.
+        bump.assert_not_called()
+        carts.recipe_changed.assert_not_called()
+        self.assertEqual(
+            [(item['id'], item['amount'])
+             for item in response.json()['ingredients']],
+            [(third.pk, 2), (first.pk, 1)])
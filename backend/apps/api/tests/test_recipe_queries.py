@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.recipes.models import Favorite, ShoppingCart
+from .factories import (create_ingredients, create_recipe, create_tags,
+                        create_user)
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        authors = [create_user(f'author{index}') for index in range(3)]
+        tags = create_tags(3)
+        ingredients = create_ingredients(10)
+        for index in range(60):
+            recipe = create_recipe(
+                authors[index % 3],
+                tags=tags[:index % 3 + 1],
+                ingredients=[(ingredient, index + 1)
+                             for ingredient in ingredients[index % 5:][:4]],
+                name=f'Рецепт {index}')
+            if index % 2:
+                Favorite.objects.create(user=cls.reader, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+
+    def setUp(self):
+        # Холодный кэш фрагментов: все рецепты страницы собираются из БД.
+        cache.clear()
+
+    def assert_constant_queries(self, client, queries):
+        for limit in (2, 50):
+            cache.clear()
+            with self.subTest(limit=limit), self.assertNumQueries(queries):
+                response = client.get('/api/recipes/', {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), limit)
+
+    def test_anonymous(self):
+        self.assert_constant_queries(APIClient(), 6)
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        self.assert_constant_queries(client, 7)
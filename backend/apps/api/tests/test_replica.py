@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from apps.recipes.models import Favorite, Tag
+
+from .factories import create_recipe, create_user
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Две базы SQLite: 'replica' заполнена отдельно, чтобы по ответу
+    было видно, откуда читал запрос.
+    """
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        # Маршрутизатор включается только на время теста: очистка баз
+        # после него проходит по обеим, как при создании схемы.
+        routing = override_settings(REPLICA_DATABASE='replica')
+        routing.enable()
+        self.addCleanup(routing.disable)
+        cache.clear()
+        Tag.objects.create(name='Основная', slug='primary')
+        Tag.objects.using('replica').create(name='Реплика', slug='replica')
+        self.user = create_user('reader')
+        self.recipe = create_recipe(self.user)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user)}')
+
+    def tag_slugs(self, client):
+        return [tag['slug'] for tag in client.get('/api/tags/').json()]
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.tag_slugs(APIClient()), ['replica'])
+        self.assertEqual(self.tag_slugs(self.client), ['replica'])
+
+    def test_writes_go_to_primary_and_pin_client(self):
+        response = self.client.post(
+            f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(Favorite.objects.filter(user=self.user).exists())
+        self.assertFalse(
+            Favorite.objects.using('replica').filter(user=self.user).exists())
+
+        # Записавший клиент читает из основной БД, остальные — с реплики.
+        self.assertEqual(self.tag_slugs(self.client), ['primary'])
+        self.assertEqual(self.tag_slugs(APIClient()), ['replica'])
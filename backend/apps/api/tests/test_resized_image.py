@@ -0,0 +1,36 @@
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.api.images import derivative_name
+
+from .factories import create_recipe, create_user, png
+
+
+@override_settings(IMAGE_RESIZE_SIZES=['160x160'])
+class ResizedImageTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = create_recipe(create_user('author'))
+
+    def get(self, path):
+        return APIClient().get(f'/api/media/160x160/{path}')
+
+    def test_resizes_upload(self):
+        response = self.get(self.recipe.image.name)
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_rejects_generated_files(self):
+        name = self.recipe.image.name
+        self.get(name).close()
+        default_storage.save(derivative_name(name, 'card'),
+                             ContentFile(png()))
+        for path in (f'resized/160x160/{name}',
+                     derivative_name(name, 'card'),
+                     f'recipes/../resized/160x160/{name}',
+                     f'../{name}'):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path).status_code, 404)
@@ -0,0 +1,115 @@
+import csv
+import io
+import json
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.recipes import shopping_list
+from apps.recipes.models import RecipeIngredient, ShoppingListItem
+
+from .factories import (create_ingredients, create_recipe, create_tags,
+                        create_user)
+
+
+def baseline(user):
+    """Список покупок так, как его считала исходная выгрузка."""
+    totals = {}
+    for row in (RecipeIngredient.objects
+                .filter(recipe__in_carts__user=user)
+                .select_related('ingredient')):
+        key = (row.ingredient.name, row.ingredient.measurement_unit)
+        totals[key] = totals.get(key, 0) + row.amount
+    return totals
+
+
+class ShoppingListTest(TestCase):
+    """Таблица итогов совпадает с агрегацией по корзине."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.users = [create_user('first'), create_user('second')]
+        cls.tags = create_tags(1)
+        cls.ingredients = create_ingredients(4)
+        first, second, third, _ = cls.ingredients
+        cls.soup = create_recipe(cls.author, cls.tags,
+                                 [(first, 100), (second, 20)], 'Суп')
+        cls.salad = create_recipe(cls.author, cls.tags,
+                                  [(second, 5), (third, 1)], 'Салат')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def assert_totals(self):
+        self.assertEqual(shopping_list.mismatches(), {})
+        for user in self.users:
+            stored = {
+                (item.ingredient.name, item.ingredient.measurement_unit):
+                item.total_amount
+                for item in ShoppingListItem.objects.filter(user=user)
+                .select_related('ingredient')}
+            self.assertEqual(stored, baseline(user))
+            self.assert_downloads(user)
+
+    def assert_downloads(self, user):
+        expected = baseline(user)
+        client = self.client_for(user)
+
+        def download(file_format):
+            response = client.get('/api/recipes/download_shopping_cart/',
+                                  {'file_format': file_format})
+            self.assertEqual(response.status_code, 200)
+            return b''.join(response.streaming_content).decode()
+
+        lines = download('txt').split('\n')
+        self.assertEqual(lines[0], 'Список покупок:')
+        self.assertCountEqual(
+            lines[1:],
+            [f'{name} ({unit}) — {amount}'
+             for (name, unit), amount in expected.items()])
+        rows = list(csv.reader(io.StringIO(download('csv'))))
+        self.assertEqual(rows[0], ['name', 'measurement_unit', 'amount'])
+        self.assertEqual(
+            {(name, unit): int(amount) for name, unit, amount in rows[1:]},
+            expected)
+        self.assertEqual(
+            {(item['name'], item['measurement_unit']): item['amount']
+             for item in json.loads(download('json'))},
+            expected)
+
+    def cart(self, user, method, recipe):
+        response = getattr(self.client_for(user), method)(
+            f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertLess(response.status_code, 300, response.content)
+
+    def test_cart_and_recipe_changes(self):
+        first, second = self.users
+        self.cart(first, 'post', self.soup)
+        self.cart(first, 'post', self.salad)
+        self.cart(second, 'post', self.soup)
+        self.assert_totals()
+
+        # Автор меняет состав рецепта, который лежит в двух корзинах:
+        # количество, удаление и новый ингредиент.
+        _, second_ingredient, _, fourth = self.ingredients
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.author).patch(
+                f'/api/recipes/{self.soup.pk}/',
+                {'tags': [tag.pk for tag in self.tags],
+                 'ingredients': [{'id': second_ingredient.pk, 'amount': 7},
+                                 {'id': fourth.pk, 'amount': 3}]},
+                format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assert_totals()
+
+        self.cart(first, 'delete', self.soup)
+        self.assert_totals()
+
+        self.assertEqual(self.client_for(self.author).delete(
+            f'/api/recipes/{self.salad.pk}/').status_code, 204)
+        self.assert_totals()
+        self.assertFalse(ShoppingListItem.objects.filter(
+            user=first).exists())
@@ -0,0 +1,50 @@
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.recipes.models import RecipeIngredient
+
+from .factories import (create_ingredients, create_recipe, create_tags,
+                        create_user, png)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Сборка JSON в БД есть только в PostgreSQL.')
+class SqlJsonTest(TestCase):
+    """Анонимный список из SQL совпадает с RecipeReadSerializer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        authors = [create_user('author'), create_user('avatar')]
+        authors[1].avatar.save('avatar.png', ContentFile(png((10, 200, 30))))
+        tags = create_tags(3)
+        ingredients = create_ingredients(6)
+        for index in range(7):
+            create_recipe(
+                authors[index % 2],
+                tags=tags[index % 3:],
+                # Ингредиенты в порядке, отличном от их id.
+                ingredients=[(ingredient, index * 10 + position + 1)
+                             for position, ingredient in enumerate(
+                                 reversed(ingredients[index % 4:]))],
+                name=f'Рецепт {index}')
+        create_recipe(authors[0], tags=tags[:1], name='Без ингредиентов')
+
+    def get(self, params, sql_json):
+        cache.clear()
+        with override_settings(RECIPE_SQL_JSON=sql_json):
+            response = APIClient().get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_matches_serializer(self):
+        self.assertTrue(RecipeIngredient.objects.exists())
+        for params in ({'limit': 50}, {'limit': 3, 'page': 2},
+                       {'pagination': 'cursor', 'limit': 4}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(params, sql_json=True),
+                                 self.get(params, sql_json=False))
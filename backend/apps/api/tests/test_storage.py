@@ -0,0 +1,47 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from apps.api.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name)
+
+    def test_same_content_written_concurrently(self):
+        name = self.storage.save('recipes/a.png', ContentFile(b'image'))
+        # Другой процесс записал файл между проверкой и записью.
+        with mock.patch.object(ContentAddressedStorage, '_touch',
+                               return_value=False):
+            again = self.storage.save('recipes/b.png', ContentFile(b'image'))
+        self.assertEqual(again, name)
+        self.assertEqual(self.storage.listdir(os.path.dirname(name)),
+                         ([], [os.path.basename(name)]))
+
+    def test_derivative_replaced(self):
+        name = 'recipes/derivatives/card/a.webp'
+        for data in (b'old', b'new'):
+            self.assertEqual(self.storage.save(name, ContentFile(data)), name)
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'new')
+
+    def test_release_keeps_recently_reused_file(self):
+        name = self.storage.save('recipes/a.png', ContentFile(b'image'))
+        self.assertFalse(self.storage.release(name))
+        self.assertTrue(self.storage.exists(name))
+
+        old = os.path.getmtime(self.storage.path(name)) - 2 * 3600
+        os.utime(self.storage.path(name), (old, old))
+        self.assertTrue(self.storage.release(name))
+        self.assertFalse(self.storage.exists(name))
+        # Повторная загрузка после удаления записывает файл заново.
+        self.assertEqual(
+            self.storage.save('recipes/b.png', ContentFile(b'image')), name)
+        self.assertTrue(self.storage.exists(name))
@@ -0,0 +1,105 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.recipes.models import Favorite, ShoppingCart
+
+from .factories import create_recipe, create_user
+
+
+class FavoriteTest(TestCase):
+    """Повторное добавление и удаление не меняют избранное."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.recipe = create_recipe(create_user('author'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_add_and_remove_twice(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['id'], self.recipe.pk)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(
+            Favorite.objects.filter(user=self.user).count(), 1)
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+
+    def test_unknown_recipe(self):
+        url = f'/api/recipes/{self.recipe.pk + 1000}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+
+
+class BatchTest(TestCase):
+    """Пакетные избранное и список покупок: статус по каждому id."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        author = create_user('author')
+        cls.recipes = [create_recipe(author, name=f'Рецепт {index}')
+                       for index in range(3)]
+        cls.unknown = cls.recipes[-1].pk + 1000
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def send(self, method, url, recipe_ids, table):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(
+                url, {'recipes': recipe_ids}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        # Вся пачка — один INSERT или DELETE в таблицу связей.
+        statements = [query['sql'] for query in queries
+                      if query['sql'].startswith(('INSERT', 'DELETE'))
+                      and f'"{table}"' in query['sql'].split('(')[0]]
+        self.assertEqual(len(statements), 1, statements)
+        return {item['id']: item['status']
+                for item in response.json()['results']}
+
+    def check_batch(self, url, model):
+        first, second, third = (recipe.pk for recipe in self.recipes)
+        table = model._meta.db_table
+        self.assertEqual(self.send('post', url, [first], table),
+                         {first: 'added'})
+        self.assertEqual(
+            self.send('post', url, [first, second, self.unknown], table),
+            {first: 'exists', second: 'added', self.unknown: 'not_found'})
+        self.assertEqual(
+            sorted(model.objects.filter(user=self.user)
+                   .values_list('recipe_id', flat=True)),
+            [first, second])
+        self.assertEqual(
+            self.send('delete', url, [second, third, self.unknown], table),
+            {second: 'removed', third: 'absent',
+             self.unknown: 'not_found'})
+        self.assertEqual(
+            list(model.objects.filter(user=self.user)
+                 .values_list('recipe_id', flat=True)),
+            [first])
+
+    def test_favorite(self):
+        self.check_batch('/api/recipes/favorite/', Favorite)
+
+    def test_shopping_cart(self):
+        self.check_batch('/api/recipes/shopping_cart/', ShoppingCart)
+
+    def test_limit(self):
+        for url in ('/api/recipes/favorite/', '/api/recipes/shopping_cart/'):
+            with self.subTest(url=url):
+                response = self.client.post(
+                    url, {'recipes': list(range(1, 102))}, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    self.client.post(url, {'recipes': list(range(1, 101))},
+                                     format='json').status_code, 200)
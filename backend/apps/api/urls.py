@@ -2,9 +2,12 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
 from .views import (health,
+                    stats,
+                    resized_image,
                     TagViewSet,
                     IngredientViewSet,
                     RecipeViewSet,
+                    UserViewSet,
                     MeView,
                     AvatarUpdateView,
                     SubscribeView,
@@ -16,9 +19,13 @@ router = DefaultRouter()
 router.register("tags", TagViewSet, basename="tags")
 router.register("ingredients", IngredientViewSet, basename="ingredients")
 router.register("recipes", RecipeViewSet, basename="recipes")
+router.register("users", UserViewSet, basename="user")
 
 urlpatterns = [
     path('health/', health),
+    path('stats/', stats),
+    path('media/<str:size>/<path:path>', resized_image,
+         name='resized-image'),
     path('users/me/', MeView.as_view(), name='me'),
     path('users/me/avatar/', AvatarUpdateView.as_view(), name='avatar'),
     path('users/<int:author_id>/subscribe/',
@@ -27,7 +34,6 @@ urlpatterns = [
     path('users/subscriptions/',
          SubscriptionsListView.as_view(),
          name='subscriptions'),
-    path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
     path('s/<int:pk>/',
          RecipeShortLinkRedirectView.as_view(),
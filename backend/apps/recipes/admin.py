@@ -3,7 +3,7 @@ from django.db.models import Count
 
 from .models import (Tag, Ingredient, Recipe, RecipeTag,
                      RecipeIngredient, Favorite,
-                     ShoppingCart)
+                     ShoppingCart, ShoppingListItem)
 
 
 FAVORITE_RECIPE_REL = (Favorite._meta.get_field('recipe')
@@ -95,3 +95,10 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
     autocomplete_fields = ('user', 'recipe')
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'total_amount')
+    search_fields = ('user__username', 'ingredient__name')
+    list_select_related = ('user', 'ingredient')
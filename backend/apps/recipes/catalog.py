@@ -0,0 +1,306 @@
+"""
+Справочник ингредиентов в двоичном файле, который воркеры отображают
+в память (mmap) только для чтения: страницы файла общие для всех
+процессов, а открытие не требует разбора.
+
+Файл: заголовок и таблица секций, затем секции — массивы array
+и строки UTF-8. Строки справочника идут в порядке ORDERING (позиция
+строки — её ранг), рядом хранятся таблица единиц измерения,
+отсортированные id с рангами, названия в нижнем регистре (для поиска
+подстроки и порядок для bisect) и обратный индекс триграмм
+с хеш-таблицей по crc32.
+"""
+import fcntl
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Ingredient
+
+MAGIC = b'FGIC'
+FORMAT = 1
+ORDERING = ('name', 'measurement_unit', 'pk')
+# Секция -> код типа array; None — байты UTF-8.
+SECTIONS = (
+    ('ids', 'q'),
+    ('units_of', 'H'),
+    ('name_offsets', 'I'),
+    ('names', None),
+    ('unit_offsets', 'I'),
+    ('units', None),
+    ('sorted_ids', 'q'),
+    ('id_ranks', 'I'),
+    ('lower_order', 'I'),
+    ('lower_offsets', 'I'),
+    ('lower_names', None),
+    ('grams', None),
+    ('gram_slots', 'I'),
+    ('posting_offsets', 'I'),
+    ('postings', 'I'),
+    ('gram_counts', 'H'),
+)
+HEADER = struct.Struct('<4sHHqI')
+SECTION = struct.Struct('<QQ')
+# Триграмма — три символа UTF-32-BE: байтовый порядок как у строк.
+GRAM_SIZE = 12
+# Разделитель названий: подстрока не может захватить два названия.
+SEPARATOR = b'\x00'
+_WORDS = re.compile(r'[^\W_]+')
+
+
+def words(text):
+    """Слова как в pg_trgm: последовательности букв и цифр."""
+    return _WORDS.findall(text)
+
+
+def trigrams(text):
+    """Триграммы как в pg_trgm: слово дополняется пробелами по краям."""
+    result = set()
+    for word in words(text.lower()):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def _strings(values, separator=b''):
+    """Строки одним блоком UTF-8 и смещения их границ."""
+    offsets = array('I', [0])
+    blob = bytearray()
+    for value in values:
+        blob += value.encode() + separator
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def _gram_key(gram):
+    return gram.encode('utf-32-be')
+
+
+def _gram_slots(keys):
+    """Хеш-таблица с открытой адресацией: слот -> номер триграммы + 1."""
+    size = 1
+    while size < 2 * len(keys):
+        size *= 2
+    slots = array('I', bytes(4 * size))
+    for index, key in enumerate(keys):
+        slot = zlib.crc32(key) & (size - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (size - 1)
+        slots[slot] = index + 1
+    return slots
+
+
+def pack(rows, stamp):
+    """Файл справочника из строк (id, name, measurement_unit)."""
+    rows = list(rows)
+    units = sorted({unit for _, _, unit in rows})
+    unit_index = {unit: index for index, unit in enumerate(units)}
+    lowered = [name.lower() for _, name, _ in rows]
+    postings = {}
+    gram_counts = array('H')
+    for rank, name in enumerate(lowered):
+        grams = trigrams(name)
+        gram_counts.append(len(grams))
+        for gram in grams:
+            postings.setdefault(gram, array('I')).append(rank)
+    grams = sorted(postings)
+    posting_offsets = array('I', [0])
+    flat = array('I')
+    for gram in grams:
+        flat.extend(postings[gram])
+        posting_offsets.append(len(flat))
+    by_id = sorted(range(len(rows)), key=lambda rank: rows[rank][0])
+    gram_keys = [_gram_key(gram) for gram in grams]
+
+    sections = {
+        'ids': array('q', (row[0] for row in rows)),
+        'units_of': array('H', (unit_index[row[2]] for row in rows)),
+        'lower_order': array('I', sorted(range(len(rows)),
+                                         key=lambda rank: lowered[rank])),
+        'sorted_ids': array('q', (rows[rank][0] for rank in by_id)),
+        'id_ranks': array('I', by_id),
+        'posting_offsets': posting_offsets,
+        'postings': flat,
+        'gram_counts': gram_counts,
+        'grams': b''.join(gram_keys),
+        'gram_slots': _gram_slots(gram_keys),
+    }
+    sections['name_offsets'], sections['names'] = _strings(
+        row[1] for row in rows)
+    sections['unit_offsets'], sections['units'] = _strings(units)
+    sections['lower_offsets'], sections['lower_names'] = _strings(
+        lowered, SEPARATOR)
+
+    table = []
+    body = bytearray()
+    start = HEADER.size + SECTION.size * len(SECTIONS)
+    for name, typecode in SECTIONS:
+        data = sections[name]
+        if typecode is not None:
+            if sys.byteorder != 'little':
+                data = array(typecode, data)
+                data.byteswap()
+            data = data.tobytes()
+        # Массивы выровнены по 8 байт.
+        body += bytes(-(start + len(body)) % 8)
+        table.append(SECTION.pack(start + len(body), len(data)))
+        body += data
+    header = HEADER.pack(MAGIC, FORMAT, 0, stamp, len(rows))
+    return header + b''.join(table) + bytes(body)
+
+
+def build(stamp, using=DEFAULT_DB_ALIAS):
+    """Файл справочника из БД."""
+    return pack(Ingredient.objects.using(using).order_by(*ORDERING)
+                .values_list('id', 'name', 'measurement_unit'), stamp)
+
+
+def write(path, data):
+    """Атомарная запись: открытые отображения старого файла не меняются."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def open_file(path):
+    """Отображает файл справочника; None, если файла нет или он чужой."""
+    try:
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+    try:
+        return Catalog(buffer)
+    except ValueError:
+        buffer.close()
+        return None
+
+
+@contextmanager
+def rebuild_lock(path):
+    """Неблокирующая межпроцессная блокировка пересборки файла."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'w') as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class Catalog:
+    """
+    Чтение файла справочника без копирования: массивы — memoryview
+    поверх буфера (mmap или bytes), строки декодируются по запросу
+    (для строковых секций хранится их смещение в буфере).
+    """
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        if sys.byteorder != 'little' or len(view) < HEADER.size:
+            raise ValueError('Неподдерживаемый файл справочника.')
+        magic, file_format, _, self.stamp, self.count = HEADER.unpack_from(
+            view)
+        if magic != MAGIC or file_format != FORMAT:
+            raise ValueError('Неподдерживаемый файл справочника.')
+        self.buffer = buffer
+        for index, (name, typecode) in enumerate(SECTIONS):
+            offset, length = SECTION.unpack_from(
+                view, HEADER.size + SECTION.size * index)
+            if typecode is None:
+                # Строки срезаются из самого буфера — быстрее memoryview.
+                setattr(self, f'_{name}', offset)
+            else:
+                setattr(self, f'_{name}',
+                        view[offset:offset + length].cast(typecode))
+        self.lower_order = self._lower_order
+        self.gram_count = self._gram_counts.__getitem__
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, base, offsets, index, end=0):
+        return self.buffer[base + offsets[index]:
+                           base + offsets[index + 1] - end].decode()
+
+    def name(self, rank):
+        return self._string(self._names, self._name_offsets, rank)
+
+    def unit(self, rank):
+        return self._string(self._units, self._unit_offsets,
+                            self._units_of[rank])
+
+    def item(self, rank):
+        """Строка в форме IngredientSerializer."""
+        return {'id': self._ids[rank],
+                'name': self.name(rank),
+                'measurement_unit': self.unit(rank)}
+
+    def lowered(self, rank):
+        return self._string(self._lower_names, self._lower_offsets, rank,
+                            len(SEPARATOR))
+
+    def rank_of(self, ingredient_id):
+        """Ранг ингредиента по id или None."""
+        index = bisect_left(self._sorted_ids, ingredient_id)
+        if (index < self.count
+                and self._sorted_ids[index] == ingredient_id):
+            return self._id_ranks[index]
+        return None
+
+    def prefix(self, prefix):
+        """Ранги названий, начинающихся с prefix (в нижнем регистре)."""
+        start = bisect_left(self.lower_order, prefix, key=self.lowered)
+        end = bisect_left(self.lower_order, prefix + '\U0010ffff', start,
+                          key=self.lowered)
+        return self.lower_order[start:end]
+
+    def containing(self, text):
+        """Ранги названий, содержащих text (в нижнем регистре)."""
+        needle = text.encode()
+        offsets = self._lower_offsets
+        base = self._lower_names
+        end = base + offsets[self.count]
+        ranks = []
+        position = self.buffer.find(needle, base, end)
+        while position != -1:
+            rank = bisect_right(offsets, position - base) - 1
+            ranks.append(rank)
+            position = self.buffer.find(needle, base + offsets[rank + 1],
+                                        end)
+        return ranks
+
+    def postings(self, gram):
+        """Ранги названий, в которых есть триграмма gram."""
+        key = _gram_key(gram)
+        slots = self._gram_slots
+        mask = len(slots) - 1
+        slot = zlib.crc32(key) & mask
+        while slots[slot]:
+            index = slots[slot] - 1
+            start = self._grams + index * GRAM_SIZE
+            if self.buffer[start:start + GRAM_SIZE] == key:
+                offsets = self._posting_offsets
+                return self._postings[offsets[index]:offsets[index + 1]]
+            slot = (slot + 1) & mask
+        return ()
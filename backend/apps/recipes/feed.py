@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F
+
+from apps.users.models import Follow
+
+from .models import FeedEntry, Recipe
+
+POPULAR_AUTHORS_KEY = 'feed:popular-authors'
+
+
+def _followers(author_id, limit):
+    """Подписчики автора или None, если их больше limit."""
+    followers = list(Follow.objects.filter(author_id=author_id)
+                     .values_list('user_id', flat=True)[:limit + 1])
+    return None if len(followers) > limit else followers
+
+
+def fan_out(recipe):
+    """
+    Раздаёт новый рецепт в ленты подписчиков автора.
+
+    Рецепты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+    не раздаются: лента читает их напрямую из рецептов.
+    """
+    followers = _followers(recipe.author_id, settings.FEED_FANOUT_LIMIT)
+    if not followers:
+        return
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(follower_id=follower_id,
+                   recipe_id=recipe.pk,
+                   author_id=recipe.author_id,
+                   pub_date=recipe.pub_date)
+         for follower_id in followers],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(follower_id, author_id):
+    """Добавляет в ленту последние рецепты автора после подписки."""
+    if _followers(author_id, settings.FEED_FANOUT_LIMIT) is None:
+        return
+    recipes = (Recipe.objects.filter(author_id=author_id)
+               .order_by('-pub_date', '-id')
+               .values_list('id', 'pub_date')[:settings.FEED_BACKFILL])
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(follower_id=follower_id,
+                   recipe_id=recipe_id,
+                   author_id=author_id,
+                   pub_date=pub_date)
+         for recipe_id, pub_date in recipes],
+        ignore_conflicts=True,
+    )
+
+
+def prune(follower_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(follower_id=follower_id,
+                             author_id=author_id).delete()
+
+
+def _popular():
+    """
+    Все авторы, чьи рецепты не раздаются: один GROUP BY по подпискам
+    раз в FEED_POPULAR_TTL секунд на все процессы.
+
+    Автор, только что набравший подписчиков сверх лимита, появится
+    в лентах не позже чем через FEED_POPULAR_TTL.
+    """
+    authors = cache.get(POPULAR_AUTHORS_KEY)
+    if authors is None:
+        authors = list(
+            Follow.objects.order_by()
+            .values('author_id')
+            .annotate(followers=Count('id'))
+            .filter(followers__gt=settings.FEED_FANOUT_LIMIT)
+            .values_list('author_id', flat=True)
+        )
+        cache.set(POPULAR_AUTHORS_KEY, authors, settings.FEED_POPULAR_TTL)
+    return authors
+
+
+def popular_authors(user):
+    """Авторы из подписок пользователя, чьи рецепты не раздаются."""
+    popular = _popular()
+    if not popular:
+        return []
+    return list(Follow.objects.filter(user=user, author_id__in=popular)
+                .values_list('author_id', flat=True))
+
+
+def sources(user):
+    """
+    Источники ленты: записи таймлайна и рецепты популярных авторов.
+
+    Оба queryset отдают строки (pub_date, recipe_id) и сливаются
+    пагинацией.
+    """
+    popular = popular_authors(user)
+    timeline = (FeedEntry.objects.filter(follower=user)
+                .values('pub_date', 'recipe_id'))
+    if not popular:
+        return [timeline]
+    return [
+        timeline.exclude(author_id__in=popular),
+        Recipe.objects.filter(author_id__in=popular)
+        .values('pub_date', recipe_id=F('id')),
+    ]
@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.api.cache import ingredient_version
+from apps.recipes import catalog
+
+
+class Command(BaseCommand):
+    help = ('Сборка файла справочника ингредиентов, который воркеры '
+            'отображают в память')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None,
+                            help='куда записать файл '
+                                 '(по умолчанию INGREDIENT_CATALOG_PATH)')
+
+    def handle(self, *args, **opts):
+        path = opts['path'] or settings.INGREDIENT_CATALOG_PATH
+        started = time.perf_counter()
+        # Версия читается до данных: если справочник изменится во время
+        # сборки, воркеры увидят новую версию и пересоберут файл.
+        data = catalog.build(ingredient_version())
+        catalog.write(path, data)
+        count = len(catalog.Catalog(data))
+        self.stdout.write(self.style.SUCCESS(
+            f'{path}: {count} ингредиентов, {len(data) / 1024:.0f} КБ, '
+            f'{(time.perf_counter() - started) * 1e3:.0f} мс.'))
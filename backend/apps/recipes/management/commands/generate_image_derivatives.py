@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from apps.api import images
+from apps.api.cache import bump_author, bump_recipe
+from apps.recipes.models import Recipe
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Построение производных для уже загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='перестроить уже готовые производные')
+
+    def handle(self, *args, **opts):
+        sources = (
+            (Recipe.objects.exclude(image=''), 'image', bump_recipe),
+            (User.objects.exclude(avatar='').exclude(avatar=None),
+             'avatar', bump_author),
+        )
+        built = failed = 0
+        for queryset, field, bump in sources:
+            for obj in queryset.only('pk', field).iterator():
+                field_file = getattr(obj, field)
+                if not opts['force'] and images.has_derivatives(field_file):
+                    continue
+                try:
+                    images.generate(field_file, wait=True)
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{field_file.name}: {error}')
+                    continue
+                bump(obj.pk)
+                built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Построено: {built}, ошибок: {failed}.'))
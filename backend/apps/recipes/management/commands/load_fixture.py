@@ -0,0 +1,252 @@
+import json
+import re
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers.base import DeserializationError
+from django.db import IntegrityError, connection, transaction
+from rest_framework.authtoken.models import Token
+
+from apps.api.authentication import token_cache
+from apps.api.cache import bump_catalog, bump_ingredients
+from apps.recipes import feed, shopping_list
+from apps.recipes.models import (FeedEntry, Ingredient, Recipe,
+                                 RecipeIngredient, ShoppingCart,
+                                 ShoppingListItem)
+from apps.users.models import Follow
+
+User = get_user_model()
+
+CHUNK_SIZE = 1 << 16
+_WHITESPACE = re.compile(r'\s*')
+
+
+def iter_fixture(file, chunk_size=CHUNK_SIZE):
+    """
+    Объекты JSON-массива по одному, без чтения файла целиком.
+
+    Читает и фикстуры, и справочник ингредиентов (load_ingredients).
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, state = '', 0, '['
+    while True:
+        position = _WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise ValueError('Файл оборван.')
+            buffer, position = chunk, 0
+            continue
+        char = buffer[position]
+        if state == '[':
+            if char != '[':
+                raise ValueError('Ожидался массив JSON.')
+            position, state = position + 1, 'first'
+        elif char == ']' and state != 'value':
+            return
+        elif state == ',':
+            if char != ',':
+                raise ValueError(
+                    f'Ожидалась запятая: {buffer[position:position + 40]}')
+            position, state = position + 1, 'value'
+        else:
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+            yield record
+            state = ','
+
+
+def dependency_order(models):
+    """Модели так, чтобы цели внешних ключей шли раньше ссылок на них."""
+    ordered, visiting = [], set()
+
+    def visit(model):
+        # Циклы допустимы: ключи проверяются после вставки всех моделей.
+        if model in ordered or model in visiting:
+            return
+        visiting.add(model)
+        for field in model._meta.concrete_fields:
+            if field.is_relation and field.related_model in models:
+                visit(field.related_model)
+        visiting.discard(model)
+        ordered.append(model)
+
+    for model in models:
+        visit(model)
+    return ordered
+
+
+@contextmanager
+def fixture_dates(model):
+    """Даты auto_now и auto_now_add берутся из фикстуры, как в loaddata."""
+    fields = [field for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False)
+              or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def upsert(model, objects, batch_size):
+    """Пакетная вставка; строки с теми же pk перезаписываются."""
+    meta = model._meta
+    manager = model._base_manager
+    fields = [field.name for field in meta.concrete_fields
+              if not field.primary_key]
+    with_pk = [obj for obj in objects if obj.pk is not None]
+    without_pk = [obj for obj in objects if obj.pk is None]
+    with fixture_dates(model):
+        if with_pk and fields:
+            manager.bulk_create(with_pk, batch_size=batch_size,
+                                update_conflicts=True,
+                                unique_fields=[meta.pk.name],
+                                update_fields=fields)
+        elif with_pk:
+            manager.bulk_create(with_pk, batch_size=batch_size,
+                                ignore_conflicts=True)
+        manager.bulk_create(without_pk, batch_size=batch_size)
+
+
+def load_m2m(model, items, batch_size):
+    """Связи многие-ко-многим из фикстуры, как set() в loaddata."""
+    for field in model._meta.many_to_many:
+        values = [(item.object.pk, item.m2m_data[field.name])
+                  for item in items if field.name in item.m2m_data]
+        if not values:
+            continue
+        through = field.remote_field.through
+        source = through._meta.get_field(field.m2m_field_name())
+        target = through._meta.get_field(field.m2m_reverse_field_name())
+        manager = through._base_manager
+        manager.filter(**{f'{source.name}__in': [pk for pk, _ in values]}
+                       ).delete()
+        manager.bulk_create(
+            [through(**{source.attname: pk, target.attname: related_pk})
+             for pk, related in values for related_pk in related],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+
+def refresh_derived(loaded):
+    """
+    То, что при сохранении по одному объекту делают сигналы и API:
+    версии кэша, снимки токенов, итоги списков покупок и ленты.
+    Таблицы итогов и лент из самой фикстуры не пересчитываются.
+    """
+    transaction.on_commit(bump_catalog)
+    if Ingredient in loaded:
+        transaction.on_commit(bump_ingredients)
+    user_ids = [user.pk for user in loaded.get(User, ())]
+    if user_ids:
+        keys = {user_id: [] for user_id in user_ids}
+        for key, user_id in (Token.objects.filter(user_id__in=user_ids)
+                             .values_list('key', 'user_id')):
+            keys[user_id].append(key)
+
+        def evict_tokens():
+            # Версия пользователя сбрасывает снимки во всех воркерах.
+            for user_id, user_keys in keys.items():
+                token_cache.evict(user_keys, user_id=user_id)
+
+        transaction.on_commit(evict_tokens)
+
+    if ShoppingListItem not in loaded:
+        recipe_ids = ({recipe.pk for recipe in loaded.get(Recipe, ())}
+                      | {item.recipe_id
+                         for item in loaded.get(RecipeIngredient, ())})
+        users = {cart.user_id for cart in loaded.get(ShoppingCart, ())}
+        if recipe_ids:
+            users.update(ShoppingCart.objects
+                         .filter(recipe_id__in=recipe_ids)
+                         .values_list('user_id', flat=True))
+        if users:
+            shopping_list.rebuild(users)
+
+    if FeedEntry not in loaded:
+        for follow in loaded.get(Follow, ()):
+            feed.backfill(follow.user_id, follow.author_id)
+        for recipe in loaded.get(Recipe, ()):
+            feed.fan_out(recipe)
+
+
+class Command(BaseCommand):
+    help = ('Быстрая загрузка фикстуры JSON: пакетные вставки по моделям '
+            'без сигналов и поштучного сохранения')
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixture', help='путь к фикстуре JSON')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='объектов в одном INSERT')
+
+    def handle(self, *args, **opts):
+        path, batch_size = opts['fixture'], opts['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        try:
+            file = open(path, encoding='utf-8')
+        except FileNotFoundError as err:
+            raise CommandError(f'Файл не найден: {path}') from err
+
+        started = time.perf_counter()
+        groups = {}
+        try:
+            with file, transaction.atomic():
+                with connection.constraint_checks_disabled():
+                    for item in serializers.deserialize(
+                            'python', iter_fixture(file)):
+                        groups.setdefault(type(item.object), []).append(item)
+                    models = dependency_order(groups)
+                    for model in models:
+                        items = groups[model]
+                        if model._meta.parents:
+                            # bulk_create не умеет наследование таблиц.
+                            for item in items:
+                                item.save()
+                        else:
+                            upsert(model, [item.object for item in items],
+                                   batch_size)
+                    for model in models:
+                        load_m2m(model, groups[model], batch_size)
+                # Ключи проверяются один раз, после всех вставок.
+                connection.check_constraints(table_names=[
+                    table for model in models
+                    for table in self.tables(model)])
+                with connection.cursor() as cursor:
+                    for sql in connection.ops.sequence_reset_sql(no_style(),
+                                                                 models):
+                        cursor.execute(sql)
+                refresh_derived({model: [item.object for item in items]
+                                 for model, items in groups.items()})
+        except (ValueError, DeserializationError, IntegrityError) as err:
+            raise CommandError(f'Не удалось загрузить {path}: {err}') from err
+        elapsed = time.perf_counter() - started
+
+        total = 0
+        for model, items in groups.items():
+            total += len(items)
+            self.stdout.write(f'{model._meta.label}: {len(items)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено объектов: {total} за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else 0:.0f} в секунду).'))
+
+    @staticmethod
+    def tables(model):
+        yield model._meta.db_table
+        for field in model._meta.many_to_many:
+            yield field.remote_field.through._meta.db_table
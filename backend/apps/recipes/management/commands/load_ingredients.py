@@ -1,36 +1,159 @@
 import csv
+import json
+import os
+import time
+from collections import Counter
+from itertools import islice
+
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from apps.api.cache import bump_catalog, bump_ingredients
 from apps.recipes.models import Ingredient
 
+from .load_fixture import iter_fixture
+
+FORMATS = ('csv', 'json', 'jsonl')
+NAME_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+
+def normalize(value):
+    """Без пробелов по краям; пробелы внутри названия не меняются."""
+    return str(value).strip() if value is not None else ''
+
+
+def read_rows(file, file_format):
+    """Пары (название, единица измерения) по мере чтения файла."""
+    if file_format == 'csv':
+        records = ({'name': row[0], 'measurement_unit': row[1]}
+                   for row in csv.reader(file) if len(row) >= 2)
+    elif file_format == 'jsonl':
+        records = (json.loads(line) for line in file if line.strip())
+    else:
+        records = iter_fixture(file)
+    for record in records:
+        if not isinstance(record, dict):
+            yield '', ''
+            continue
+        yield (normalize(record.get('name')),
+               normalize(record.get('measurement_unit')))
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
 
 class Command(BaseCommand):
-    help = 'Загрузка ингредиентов из CSV'
+    help = 'Загрузка ингредиентов из CSV, JSON или JSON Lines'
 
     def add_arguments(self, parser):
         parser.add_argument('--path', default='data/ingredients.csv')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='формат файла (по умолчанию по расширению)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='строк файла на один запрос к БД')
+        parser.add_argument('--upsert', action='store_true',
+                            help='менять единицу измерения у ингредиента '
+                                 'с тем же названием')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='только показать, что изменится')
+        parser.add_argument('--show', type=int, default=20,
+                            help='сколько изменений вывести при --dry-run')
 
     def handle(self, *args, **opts):
         path = opts['path']
+        file_format = (opts['format']
+                       or os.path.splitext(path)[1].lstrip('.').lower())
+        if file_format not in FORMATS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if opts['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
         try:
             file = open(path, encoding='utf-8')
         except FileNotFoundError as err:
             raise CommandError(f'Файл не найден: {path}') from err
 
-        with file:
-            reader = csv.reader(file, delimiter=',')
-            created = 0
-            for row in reader:
-                if len(row) < 2:
-                    continue
-
-                name = row[0].strip()
-                measurement_unit = row[1].strip()
-                _, is_created = Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=measurement_unit,)
-                created += int(is_created)
+        self.opts = opts
+        self.stats = Counter()
+        self.seen = set()
+        self.names = set()
+        self.shown = 0
+        started = time.perf_counter()
+        try:
+            with file, transaction.atomic():
+                for chunk in chunks(read_rows(file, file_format),
+                                    opts['batch_size']):
+                    self.load(chunk)
+        except (ValueError, csv.Error) as err:
+            raise CommandError(f'Не удалось прочитать {path}: {err}') from err
+        elapsed = time.perf_counter() - started
 
+        stats = self.stats
+        if not opts['dry_run'] and (stats['created'] or stats['updated']):
+            # bulk_create и bulk_update не отправляют сигналы моделей.
+            bump_ingredients()
+            bump_catalog()
         self.stdout.write(self.style.SUCCESS(
-            f'Ингредиенты: создано={created}.'
-        ))
+            ('Без записи в БД. ' if opts['dry_run'] else '')
+            + f'Ингредиенты: прочитано={stats["read"]}, '
+            f'создано={stats["created"]}, обновлено={stats["updated"]}, '
+            f'без изменений={stats["unchanged"]}, '
+            f'повторов={stats["duplicates"]}, пропущено={stats["skipped"]}; '
+            f'{stats["read"] / elapsed if elapsed else 0:.0f} строк/с.'))
+
+    def load(self, chunk):
+        """Сверяет часть файла с БД одним запросом и записывает разницу."""
+        stats = self.stats
+        rows = []
+        for name, unit in chunk:
+            stats['read'] += 1
+            if (not name or not unit or len(name) > NAME_LENGTH
+                    or len(unit) > UNIT_LENGTH):
+                stats['skipped'] += 1
+            elif (name, unit) in self.seen:
+                stats['duplicates'] += 1
+            else:
+                self.seen.add((name, unit))
+                rows.append((name, unit))
+
+        existing = {}
+        for pk, name, unit in (
+                Ingredient.objects
+                .filter(name__in={name for name, _ in rows})
+                .values_list('id', 'name', 'measurement_unit')):
+            existing.setdefault(name, []).append((pk, unit))
+
+        created, updated = [], []
+        for name, unit in rows:
+            found = existing.get(name, ())
+            # Единица меняется только у первого упоминания названия
+            # и только если в БД ровно один такой ингредиент.
+            first = name not in self.names
+            self.names.add(name)
+            if any(old == unit for _, old in found):
+                stats['unchanged'] += 1
+            elif self.opts['upsert'] and first and len(found) == 1:
+                pk, old = found[0]
+                updated.append(Ingredient(pk=pk, name=name,
+                                          measurement_unit=unit))
+                self.report(f'~ {name}: {old} -> {unit}')
+            else:
+                created.append(Ingredient(name=name, measurement_unit=unit))
+                self.report(f'+ {name} ({unit})')
+        stats['created'] += len(created)
+        stats['updated'] += len(updated)
+
+        if self.opts['dry_run']:
+            return
+        # Строки, которые параллельно успел добавить кто-то другой,
+        # пропускаются ограничением unique_ingredient.
+        Ingredient.objects.bulk_create(created, ignore_conflicts=True)
+        Ingredient.objects.bulk_update(updated, ['measurement_unit'])
+
+    def report(self, line):
+        if self.opts['dry_run'] and self.shown < self.opts['show']:
+            self.shown += 1
+            self.stdout.write(line)
@@ -0,0 +1,58 @@
+import os
+import time
+from contextlib import suppress
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from apps.api.images import DERIVATIVES_DIR
+
+
+class Command(BaseCommand):
+    help = ('Удаление изображений, на которые не ссылается ни одна '
+            'строка БД, вместе с их производными и вариантами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='только показать, что будет удалено')
+
+    def handle(self, *args, **opts):
+        storage = default_storage
+        referenced = storage.referenced()
+
+        root = os.path.abspath(storage.location)
+        resized = os.path.abspath(settings.IMAGE_RESIZE_ROOT)
+        deadline = time.time() - settings.IMAGE_RELEASE_GRACE
+        candidates = removed = 0
+        for directory, subdirs, names in os.walk(root):
+            # Производные и варианты удаляются вместе с оригиналом.
+            subdirs[:] = [
+                subdir for subdir in subdirs
+                if subdir != DERIVATIVES_DIR
+                and os.path.join(directory, subdir) != resized]
+            for filename in names:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if name in referenced:
+                    continue
+                if filename.startswith('.tmp-'):
+                    # Недописанный файл упавшего процесса.
+                    if not opts['dry_run']:
+                        with suppress(FileNotFoundError):
+                            if os.path.getmtime(path) < deadline:
+                                os.remove(path)
+                    continue
+                candidates += 1
+                if opts['dry_run']:
+                    self.stdout.write(name)
+                elif storage.release(name):
+                    removed += 1
+
+        if opts['dry_run']:
+            message = f'Файлов без ссылок: {candidates}.'
+        else:
+            message = (f'Удалено файлов: {removed} из {candidates} '
+                       f'без ссылок; остальные моложе '
+                       f'{settings.IMAGE_RELEASE_GRACE} с.')
+        self.stdout.write(self.style.SUCCESS(message))
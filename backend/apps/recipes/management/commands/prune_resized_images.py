@@ -0,0 +1,49 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Удаление давно не запрошенных вариантов изображений, '
+            'пока кэш не уложится в лимит')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-mb', type=int,
+                            default=settings.IMAGE_RESIZE_MAX_MB,
+                            help='допустимый размер кэша, МБ')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='только показать, что будет удалено')
+
+    def handle(self, *args, **opts):
+        files = []
+        for directory, _, names in os.walk(settings.IMAGE_RESIZE_ROOT):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_atime, stat.st_size, path))
+
+        # LRU по времени последнего чтения: nginx и Django обновляют
+        # atime при отдаче (при relatime — не чаще раза в сутки).
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        limit = opts['max_mb'] * 1024 * 1024
+        removed = freed = 0
+        for _, size, path in files:
+            if total - freed <= limit:
+                break
+            if not opts['dry_run']:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            removed += 1
+            freed += size
+
+        action = 'Будет удалено' if opts['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} файлов: {removed}, {freed / 1024 / 1024:.1f} МБ; '
+            f'в кэше {(total - freed) / 1024 / 1024:.1f} МБ.'))
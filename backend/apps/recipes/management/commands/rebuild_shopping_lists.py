@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.recipes import shopping_list
+
+
+class Command(BaseCommand):
+    help = 'Пересборка и проверка таблицы итогов списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users',
+                            help='id пользователя (можно несколько раз)')
+        parser.add_argument('--verify-only', action='store_true',
+                            help='только сравнить с живой агрегацией')
+
+    def handle(self, *args, **opts):
+        users = opts['users']
+        if not opts['verify_only']:
+            with transaction.atomic():
+                shopping_list.rebuild(users)
+            self.stdout.write('Итоги пересобраны.')
+
+        diff = shopping_list.mismatches(users)
+        for (user_id, ingredient_id), (stored, live) in sorted(
+                diff.items())[:20]:
+            self.stdout.write(f'user={user_id} ingredient={ingredient_id}: '
+                              f'в таблице {stored}, по корзинам {live}')
+        if diff:
+            raise CommandError(f'Расхождений: {len(diff)}.')
+        self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
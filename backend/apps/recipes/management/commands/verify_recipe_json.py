@@ -0,0 +1,52 @@
+import json
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from apps.api import sql_json
+from apps.api.serializers import RecipeReadSerializer
+from apps.recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сверка JSON рецептов, собранного в PostgreSQL, '
+            'с RecipeReadSerializer')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='сколько последних рецептов проверить')
+        parser.add_argument('--host', default='localhost',
+                            help='хост для абсолютных ссылок')
+
+    def handle(self, *args, **opts):
+        queryset = Recipe.objects.all()
+        if not sql_json.supported(queryset):
+            raise CommandError('Сборка JSON в БД доступна только '
+                               'в PostgreSQL.')
+        request = Request(RequestFactory().get('/', HTTP_HOST=opts['host']))
+        request.user = AnonymousUser()
+        context = {'request': request}
+
+        rows = sql_json.with_payload(queryset, request)
+        if opts['limit']:
+            rows = rows[:opts['limit']]
+        payloads = {row['id']: json.loads(row['payload']) for row in rows}
+        recipes = Recipe.objects.filter(pk__in=payloads).prefetch_related(
+            'tags', 'recipe_ingredients__ingredient').select_related('author')
+
+        mismatches = 0
+        for recipe in recipes:
+            expected = RecipeReadSerializer(recipe, context=context).data
+            expected = json.loads(json.dumps(expected))
+            if payloads[recipe.pk] != expected:
+                mismatches += 1
+                self.stdout.write(f'Рецепт {recipe.pk}:\n'
+                                  f'  БД:     {payloads[recipe.pk]}\n'
+                                  f'  Python: {expected}')
+        if mismatches:
+            raise CommandError(f'Расхождений: {mismatches} '
+                               f'из {len(payloads)}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Совпадают все {len(payloads)} рецептов.'))
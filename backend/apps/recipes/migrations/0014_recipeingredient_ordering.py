@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 07:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_ingredient_name_trgm'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipeingredient',
+            options={'ordering': ('id',), 'verbose_name': 'Ингедиент для рецепта', 'verbose_name_plural': 'Ингедиенты для рецепта'},
+        ),
+    ]
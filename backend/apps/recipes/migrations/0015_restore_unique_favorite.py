@@ -0,0 +1,40 @@
+from django.db import migrations
+from django.db.models import Min
+
+
+def restore_unique_favorite(apps, schema_editor):
+    """
+    Возвращает в БД ограничение unique_favorite.
+
+    Миграция 0006 удалила его только из БД: в состоянии моделей оно
+    осталось, и Favorite.objects.add полагается на него (ON CONFLICT
+    DO NOTHING). Повторы, накопившиеся без ограничения, удаляются,
+    остаётся самая ранняя строка.
+    """
+    Favorite = apps.get_model('recipes', 'Favorite')
+    manager = Favorite._base_manager.db_manager(schema_editor.connection.alias)
+    first = (manager.order_by().values('user_id', 'recipe_id')
+             .annotate(first=Min('id')).values('first'))
+    manager.exclude(id__in=first).delete()
+
+    table = Favorite._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        constraints = schema_editor.connection.introspection.get_constraints(
+            cursor, table)
+    if 'unique_favorite' not in constraints:
+        constraint, = (constraint
+                       for constraint in Favorite._meta.constraints
+                       if constraint.name == 'unique_favorite')
+        schema_editor.add_constraint(Favorite, constraint)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipeingredient_ordering'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_unique_favorite,
+                             migrations.RunPython.noop),
+    ]
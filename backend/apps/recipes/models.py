@@ -1,8 +1,9 @@
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import connections, models
 from django.db.models import UniqueConstraint
 from django.db.models.functions import Lower
+from django.utils import timezone
 
 
 User = settings.AUTH_USER_MODEL
@@ -112,6 +113,8 @@ class RecipeIngredient(models.Model):
             UniqueConstraint(fields=('recipe', 'ingredient'),
                              name='unique_recipe_ingredient'),
         ]
+        # Строки состава создаются в порядке, в котором их прислал автор.
+        ordering = ('id',)
         verbose_name = 'Ингедиент для рецепта'
         verbose_name_plural = 'Ингедиенты для рецепта'
 
@@ -119,6 +122,107 @@ class RecipeIngredient(models.Model):
         return f'{self.ingredient} × {self.amount} для {self.recipe}'
 
 
+class UserRecipeManager(models.Manager):
+    """
+    Добавление и удаление связи пользователь — рецепт одним запросом.
+
+    Уникальность (user, recipe) обеспечивает БД: INSERT ... ON CONFLICT
+    DO NOTHING не падает на параллельных запросах, а по RETURNING
+    видно, была ли строка добавлена.
+    """
+
+    def _columns(self, connection):
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        return (quote(meta.db_table),
+                quote(meta.get_field('user').column),
+                quote(meta.get_field('recipe').column),
+                quote(meta.get_field('created').column))
+
+    def _insert_sql(self, connection, count):
+        table, user, recipe, created = self._columns(connection)
+        quote = connection.ops.quote_name
+        recipe_table = quote(Recipe._meta.db_table)
+        recipe_pk = quote(Recipe._meta.pk.column)
+        placeholders = ', '.join(['%s'] * count)
+        return (
+            f'INSERT INTO {table} ({user}, {recipe}, {created}) '
+            f'SELECT %s, {recipe_pk}, %s FROM {recipe_table} '
+            f'WHERE {recipe_pk} IN ({placeholders}) '
+            f'ON CONFLICT DO NOTHING '
+            f'RETURNING {recipe}'
+        )
+
+    def _insert_params(self, connection, user, recipe_ids):
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        return [user.pk, now, *recipe_ids]
+
+    def add_many(self, user, recipe_ids):
+        """
+        Связывает рецепты с пользователем одним INSERT.
+
+        Возвращает id рецептов, для которых связь действительно
+        появилась: уже добавленные и несуществующие пропускаются.
+        """
+        if not recipe_ids:
+            return []
+        connection = connections[self.db]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                self._insert_sql(connection, len(recipe_ids)),
+                self._insert_params(connection, user, recipe_ids))
+            return [row[0] for row in cursor.fetchall()]
+
+    def add(self, user, recipe_id):
+        """
+        Связывает рецепт с пользователем.
+
+        Возвращает рецепт (id, name, image, cooking_time) или None,
+        если связь уже есть или рецепта не существует.
+        """
+        connection = connections[self.db]
+        if connection.vendor != 'postgresql':
+            if not self.add_many(user, [recipe_id]):
+                return None
+            return (Recipe.objects.db_manager(self.db)
+                    .only('id', 'name', 'image', 'cooking_time')
+                    .get(pk=recipe_id))
+
+        # Вставка и чтение рецепта для ответа — один запрос.
+        quote = connection.ops.quote_name
+        _, _, recipe, _ = self._columns(connection)
+        recipe_pk = quote(Recipe._meta.pk.column)
+        columns = ', '.join(
+            f'r.{quote(Recipe._meta.get_field(name).column)}'
+            for name in ('id', 'name', 'image', 'cooking_time'))
+        recipes = Recipe.objects.db_manager(self.db).raw(
+            f'WITH added AS ({self._insert_sql(connection, 1)}) '
+            f'SELECT {columns} FROM {quote(Recipe._meta.db_table)} r '
+            f'JOIN added ON added.{recipe} = r.{recipe_pk}',
+            self._insert_params(connection, user, [recipe_id]))
+        return next(iter(recipes), None)
+
+    def remove_many(self, user, recipe_ids):
+        """Удаляет связи одним DELETE, возвращает id удалённых рецептов."""
+        if not recipe_ids:
+            return []
+        # QuerySet.delete() оборачивает удаление в транзакцию
+        # (BEGIN/COMMIT) — здесь достаточно одного оператора.
+        connection = connections[self.db]
+        table, user_column, recipe, _ = self._columns(connection)
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {user_column} = %s '
+                f'AND {recipe} IN ({placeholders}) RETURNING {recipe}',
+                [user.pk, *recipe_ids])
+            return [row[0] for row in cursor.fetchall()]
+
+    def remove(self, user, recipe_id):
+        """Удаляет связь, возвращает True, если она была."""
+        return bool(self.remove_many(user, [recipe_id]))
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(User,
                              related_name='favorites',
@@ -128,6 +232,8 @@ class Favorite(models.Model):
                                on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = UserRecipeManager()
+
     class Meta:
         constraints = [
             UniqueConstraint(fields=('user', 'recipe'),
@@ -150,6 +256,8 @@ class ShoppingCart(models.Model):
                                on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = UserRecipeManager()
+
     class Meta:
         constraints = [
             UniqueConstraint(fields=('user', 'recipe'),
@@ -161,3 +269,70 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} — {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Итог по ингредиенту в списке покупок пользователя.
+
+    Обновляется при изменении корзины и состава рецептов в ней.
+    """
+
+    user = models.ForeignKey(User,
+                             related_name='shopping_list',
+                             on_delete=models.CASCADE,
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient,
+                                   on_delete=models.CASCADE,
+                                   verbose_name='Ингредиент')
+    total_amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=('user', 'ingredient'),
+                             name='unique_shopping_list_item'),
+        ]
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+
+    def __str__(self):
+        return f'{self.user} — {self.ingredient} × {self.total_amount}'
+
+
+class FeedEntry(models.Model):
+    """
+    Запись ленты подписок.
+
+    Заполняется при публикации рецепта (fan-out on write) для всех
+    подписчиков автора, кроме очень популярных авторов — их рецепты
+    лента читает напрямую.
+    """
+
+    follower = models.ForeignKey(User,
+                                 related_name='feed',
+                                 on_delete=models.CASCADE,
+                                 verbose_name='Подписчик')
+    recipe = models.ForeignKey(Recipe,
+                               related_name='feed_entries',
+                               on_delete=models.CASCADE,
+                               verbose_name='Рецепт')
+    author = models.ForeignKey(User,
+                               related_name='+',
+                               on_delete=models.CASCADE,
+                               verbose_name='Автор')
+    pub_date = models.DateTimeField(verbose_name='Дата')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=('follower', 'recipe'),
+                             name='unique_feed_entry'),
+        ]
+        indexes = (
+            models.Index(fields=('follower', '-pub_date', '-recipe'),
+                         name='feed_follower_pub_date_idx'),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+    def __str__(self):
+        return f'{self.follower} — {self.recipe}'
@@ -0,0 +1,140 @@
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+
+def shopping_list(user, catalog=None):
+    """
+    Готовый список покупок из таблицы итогов.
+
+    С файлом справочника (catalog) названия и единицы берутся из него,
+    без JOIN с ингредиентами; порядок — ранг в справочнике.
+    """
+    items = ShoppingListItem.objects.filter(user=user)
+    if catalog is not None:
+        rows = [(catalog.rank_of(ingredient_id), amount)
+                for ingredient_id, amount in items.values_list(
+                    'ingredient_id', 'total_amount')]
+        if all(rank is not None for rank, _ in rows):
+            return ({'name': catalog.name(rank),
+                     'measurement_unit': catalog.unit(rank),
+                     'amount': amount}
+                    for rank, amount in sorted(rows))
+    return (
+        items
+        .values(name=F('ingredient__name'),
+                measurement_unit=F('ingredient__measurement_unit'),
+                amount=F('total_amount'))
+        .order_by('name', 'measurement_unit')
+        .iterator(chunk_size=500)
+    )
+
+
+def live_totals(user_ids=None):
+    """Итоги (user_id, ingredient_id) -> количество прямо по корзинам."""
+    carts = ShoppingCart.objects.filter(
+        recipe__recipe_ingredients__isnull=False)
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+    return (
+        carts
+        .values('user_id',
+                ingredient_id=F('recipe__recipe_ingredients__ingredient_id'))
+        .annotate(total_amount=Sum('recipe__recipe_ingredients__amount'))
+        .order_by()
+    )
+
+
+def _recipe_amounts(recipe_ids):
+    return dict(
+        RecipeIngredient.objects
+        .filter(recipe_id__in=recipe_ids)
+        .values('ingredient_id')
+        .annotate(amount=Sum('amount'))
+        .order_by()
+        .values_list('ingredient_id', 'amount')
+    )
+
+
+def _apply(user_ids, deltas):
+    """Прибавляет deltas {ingredient_id: delta} к итогам пользователей."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not user_ids or not deltas:
+        return
+    ShoppingListItem.objects.bulk_create(
+        [ShoppingListItem(user_id=user_id,
+                          ingredient_id=ingredient_id,
+                          total_amount=0)
+         for user_id in user_ids
+         for ingredient_id, delta in deltas.items() if delta > 0],
+        ignore_conflicts=True,
+    )
+    items = ShoppingListItem.objects.filter(user_id__in=user_ids,
+                                            ingredient_id__in=deltas)
+    items.update(total_amount=Greatest(
+        F('total_amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(delta))
+              for ingredient_id, delta in deltas.items()),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    ))
+    items.filter(total_amount=0).delete()
+
+
+def add_to_cart(user_id, recipe_ids):
+    """Учитывает рецепты, добавленные в корзину."""
+    _apply([user_id], _recipe_amounts(recipe_ids))
+
+
+def remove_from_cart(user_id, recipe_ids):
+    """Учитывает рецепты, убранные из корзины."""
+    _apply([user_id], {ingredient_id: -amount for ingredient_id, amount
+                       in _recipe_amounts(recipe_ids).items()})
+
+
+def recipe_changed(recipe_id, old, new):
+    """
+    Переносит изменение состава рецепта в списки покупок.
+
+    old и new — словари {ingredient_id: amount} до и после изменения.
+    """
+    deltas = {ingredient_id: new.get(ingredient_id, 0)
+              - old.get(ingredient_id, 0)
+              for ingredient_id in old.keys() | new.keys()}
+    if not any(deltas.values()):
+        return
+    user_ids = list(ShoppingCart.objects
+                    .filter(recipe_id=recipe_id)
+                    .values_list('user_id', flat=True))
+    _apply(user_ids, deltas)
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    """Пересобирает итоги с нуля по текущим корзинам."""
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    items.delete()
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(**row)
+         for row in live_totals(user_ids).iterator()),
+        batch_size=batch_size,
+    )
+
+
+def mismatches(user_ids=None):
+    """Расхождения таблицы итогов с живой агрегацией по корзинам."""
+    live = {(row['user_id'], row['ingredient_id']): row['total_amount']
+            for row in live_totals(user_ids).iterator()}
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    stored = {(user_id, ingredient_id): amount
+              for user_id, ingredient_id, amount in items.values_list(
+                  'user_id', 'ingredient_id', 'total_amount').iterator()}
+    return {key: (stored.get(key), live.get(key))
+            for key in stored.keys() | live.keys()
+            if stored.get(key) != live.get(key)}
@@ -0,0 +1,104 @@
+"""
+Задержка автодополнения ингредиентов: ORM (istartswith) и индекс
+процесса (apps.api.ingredient_index), а также время, за которое воркер
+получает справочник: сборка из БД и отображение готового файла.
+
+Запросы — префиксы длиной 1–4 символа от случайных названий из
+справочника, как при наборе текста. Перед замером проверяется, что
+оба пути возвращают одно и то же. Нужна БД с загруженными
+ингредиентами.
+
+Запуск из каталога backend:
+    python benchmarks/ingredient_search.py --queries 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from apps.api import ingredient_index  # noqa: E402
+from apps.api.filters import IngredientFilter  # noqa: E402
+from apps.api.serializers import IngredientSerializer  # noqa: E402
+from apps.recipes import catalog  # noqa: E402
+from apps.recipes.models import Ingredient  # noqa: E402
+
+
+def orm(prefix, limit):
+    queryset = IngredientFilter({'name': prefix},
+                                Ingredient.objects.all()).qs[:limit]
+    return IngredientSerializer(queryset, many=True).data
+
+
+def index(prefix, limit):
+    return ingredient_index.lookup(prefix, limit)
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return (statistics.median(timings) * 1e6,
+            timings[int(len(timings) * 0.99) - 1] * 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    names = list(Ingredient.objects.values_list('name', flat=True))
+    if not names:
+        raise SystemExit('Справочник ингредиентов пуст.')
+    random.seed(args.seed)
+    # Как во вьюсете: пробелы по краям отбрасываются.
+    prefixes = [random.choice(names)[:random.randint(1, 4)].strip() or 'а'
+                for _ in range(args.queries)]
+    limit = settings.INGREDIENT_SEARCH_LIMIT
+
+    # LIKE в SQLite не учитывает регистр только для ASCII, поэтому
+    # сверка с ORM имеет смысл на PostgreSQL.
+    checked = connection.vendor == 'postgresql'
+    for prefix in set(prefixes) if checked else ():
+        expected = [dict(item) for item in orm(prefix, limit)]
+        if expected != index(prefix, limit):
+            raise SystemExit(f'Результаты различаются: {prefix!r}.')
+
+    print(f'{len(names)} ингредиентов, {args.queries} запросов, '
+          f'не более {limit} строк'
+          + ('' if checked else ', без сверки с ORM'))
+    for name, search in (('ORM', orm), ('индекс', index)):
+        timings = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            search(prefix, limit)
+            timings.append(time.perf_counter() - start)
+        p50, p99 = percentiles(timings)
+        print(f'{name:>7}: p50 {p50:8.1f} мкс, p99 {p99:8.1f} мкс')
+
+    start = time.perf_counter()
+    catalog.build(0)
+    built = time.perf_counter() - start
+    index('', limit)
+    path = settings.INGREDIENT_CATALOG_PATH
+    start = time.perf_counter()
+    catalog.open_file(path)
+    opened = time.perf_counter() - start
+    print(f'справочник: сборка из БД {built * 1e3:.1f} мс, '
+          f'отображение файла ({os.path.getsize(path) // 1024} КБ) '
+          f'{opened * 1e3:.2f} мс')
+
+
+if __name__ == '__main__':
+    main()
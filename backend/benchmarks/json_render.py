@@ -0,0 +1,95 @@
+"""
+Рендеринг JSON: JSONRenderer DRF и FastJSONRenderer (orjson).
+
+Данные берутся из data/test_data.json: список ингредиентов в форме
+/api/ingredients/ и рецепты с автором, тегами и датой публикации
+(datetime) в форме /api/recipes/. Перед замером проверяется, что оба
+рендерера дают одинаковый JSON.
+
+Запуск из каталога backend:
+    python benchmarks/json_render.py --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from apps.api.renderers import FastJSONRenderer, orjson  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))), 'data', 'test_data.json')
+
+
+def payloads():
+    with open(FIXTURE, encoding='utf-8') as file:
+        fixture = json.load(file)
+    objects = {}
+    for item in fixture:
+        objects.setdefault(item['model'], []).append(
+            dict(item['fields'], id=item['pk']))
+
+    ingredients = objects['recipes.ingredient']
+    tags = objects['recipes.tag']
+    users = {user['id']: {
+        'id': user['id'], 'email': user['email'],
+        'username': user['username'], 'first_name': user['first_name'],
+        'last_name': user['last_name'],
+        'avatar': user.get('avatar') or None, 'is_subscribed': False,
+    } for user in objects['users.user']}
+    recipes = [{
+        'id': recipe['id'],
+        'tags': tags,
+        'author': users[recipe['author']],
+        'ingredients': [dict(ingredient, amount=index + 1) for index,
+                        ingredient in enumerate(ingredients[:8])],
+        'is_favorited': False,
+        'is_in_shopping_cart': False,
+        'name': recipe['name'],
+        'image': recipe['image'],
+        'text': recipe['text'],
+        'cooking_time': recipe['cooking_time'],
+        'pub_date': datetime.fromisoformat(recipe['pub_date']),
+    } for recipe in objects['recipes.recipe']]
+    return {
+        'ингредиенты': ingredients,
+        'страница рецептов': {'count': len(recipes), 'next': None,
+                              'previous': None, 'results': recipes},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print('orjson не установлен: FastJSONRenderer использует stdlib.')
+    drf, fast = JSONRenderer(), FastJSONRenderer()
+    for name, data in payloads().items():
+        if drf.render(data) != fast.render(data):
+            raise SystemExit(f'JSON различается: {name}.')
+        size = len(drf.render(data))
+        results = [
+            min(timeit.repeat(lambda: renderer.render(data), number=50,
+                              repeat=args.repeat)) / 50 * 1e3
+            for renderer in (drf, fast)
+        ]
+        print(f'{name} ({size / 1024:.0f} КБ): DRF {results[0]:.2f} мс, '
+              f'fast {results[1]:.2f} мс, '
+              f'ускорение {results[0] / results[1]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Стоимость сериализации рецепта: RecipeReadSerializer и compile_serializer.
+
+Рецепты собираются в памяти вместе с «предзагруженными» тегами,
+ингредиентами и автором, поэтому БД не нужна и измеряется только
+сериализация. Перед замером проверяется, что JSON обоих путей
+совпадает байт в байт.
+
+Запуск из каталога backend:
+    python benchmarks/recipe_serializer.py --repeat 20
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from apps.api.compiled import compile_serializer  # noqa: E402
+from apps.api.serializers import RecipeReadSerializer  # noqa: E402
+from apps.recipes.models import (Ingredient,  # noqa: E402
+                                 Recipe,
+                                 RecipeIngredient,
+                                 Tag)
+from apps.users.models import User  # noqa: E402
+
+
+def _prefetched(model, objects):
+    queryset = model.objects.all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    return queryset
+
+
+def make_recipes(count):
+    tags = [Tag(id=i, name=f'Тег {i}', slug=f'tag{i}') for i in range(1, 4)]
+    ingredients = [Ingredient(id=i, name=f'Ингредиент {i}',
+                              measurement_unit='г') for i in range(1, 9)]
+    authors = [User(id=i, email=f'user{i}@example.com',
+                    username=f'user{i}', first_name='Имя',
+                    last_name='Фамилия', avatar=f'avatars/{i}.jpg')
+               for i in range(1, 6)]
+    recipes = []
+    for i in range(1, count + 1):
+        recipe = Recipe(id=i, name=f'Рецепт {i}', text='Описание ' * 20,
+                        cooking_time=i % 90 + 1, image=f'recipes/{i}.jpg',
+                        pub_date=datetime(2024, 1, 1, tzinfo=timezone.utc))
+        recipe.author = authors[i % len(authors)]
+        recipe.is_favorited = bool(i % 2)
+        recipe.is_in_shopping_cart = bool(i % 3)
+        recipe._prefetched_objects_cache = {
+            'tags': _prefetched(Tag, tags[:i % 3 + 1]),
+            'recipe_ingredients': _prefetched(RecipeIngredient, [
+                RecipeIngredient(id=i * 10 + j, recipe=recipe,
+                                 ingredient=ingredient, amount=j + 1)
+                for j, ingredient in enumerate(ingredients[:i % 8 + 1])
+            ]),
+        }
+        recipes.append(recipe)
+    return recipes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    renderer = JSONRenderer()
+    print(f'{"рецептов":>9} {"DRF, мкс/шт":>13} {"compiled, мкс/шт":>17} '
+          f'{"ускорение":>10}')
+    for size in (6, 50, 500):
+        recipes = make_recipes(size)
+        serializer = RecipeReadSerializer(context={'image_size': None})
+
+        def drf():
+            return [serializer.to_representation(recipe)
+                    for recipe in recipes]
+
+        def compiled():
+            represent = compile_serializer(serializer)
+            return [represent(recipe) for recipe in recipes]
+
+        if renderer.render(drf()) != renderer.render(compiled()):
+            raise SystemExit(f'JSON различается на странице из {size}.')
+        number = max(1, 3000 // size)
+        results = []
+        for func in (drf, compiled):
+            best = min(timeit.repeat(func, number=number,
+                                     repeat=args.repeat))
+            results.append(best / number / size * 1e6)
+        print(f'{size:>9} {results[0]:>13.1f} {results[1]:>17.1f} '
+              f'{results[0] / results[1]:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Пиковая память (RSS) при загрузке изображения: base64 в JSON и multipart.
+
+Каждый вариант запускается в отдельном процессе: запрос собирается
+RequestFactory, разбирается парсерами RecipeViewSet и проходит
+через Base64ImageField. БД не нужна.
+
+Запуск из каталога backend:
+    python benchmarks/upload_memory.py --size-mb 8
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+
+def make_image(size_mb):
+    """PNG из случайного шума примерно заданного размера."""
+    from PIL import Image
+
+    side = int((size_mb * 1024 * 1024 / 3) ** 0.5)
+    image = Image.frombytes('RGB', (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', compress_level=0)
+    return buffer.getvalue()
+
+
+def peak_rss_mb():
+    # ru_maxrss в Linux — в килобайтах.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(mode, size_mb):
+    import django
+
+    django.setup()
+    from django.test import RequestFactory
+    from rest_framework.request import Request
+
+    from apps.api.fields import Base64ImageField
+    from apps.api.views import RecipeViewSet
+
+    data = make_image(size_mb)
+    factory = RequestFactory()
+    if mode == 'base64':
+        body = json.dumps({'image': 'data:image/png;base64,'
+                           + base64.b64encode(data).decode()})
+        django_request = factory.post('/api/recipes/', body,
+                                      content_type='application/json')
+    else:
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        django_request = factory.post(
+            '/api/recipes/',
+            {'image': SimpleUploadedFile('image.png', data, 'image/png')})
+    del data
+
+    baseline = peak_rss_mb()
+    request = Request(django_request,
+                      parsers=[parser() for parser
+                               in RecipeViewSet.parser_classes])
+    field = Base64ImageField()
+    field.bind('image', None)
+    field.to_internal_value(request.data['image'])
+    return baseline, peak_rss_mb()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size-mb', type=float, default=8)
+    parser.add_argument('--mode', choices=('base64', 'multipart'))
+    args = parser.parse_args()
+
+    if args.mode:
+        baseline, peak = run(args.mode, args.size_mb)
+        print(json.dumps({'baseline': baseline, 'peak': peak}))
+        return
+
+    print(f'Изображение ~{args.size_mb} МБ')
+    for mode in ('base64', 'multipart'):
+        output = subprocess.run(
+            [sys.executable, __file__, '--mode', mode,
+             '--size-mb', str(args.size_mb)],
+            check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f'{mode:>10}: пик RSS {result["peak"]:.1f} МБ, '
+              f'рост при разборе {result["peak"] - result["baseline"]:.1f} МБ')
+
+
+if __name__ == '__main__':
+    main()
@@ -36,6 +36,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.api.replica.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -63,6 +64,21 @@ DATABASES = {
     }
 }
 
+# Реплика для чтения списков рецептов, ингредиентов, тегов
+# и пользователей (apps.api.replica). Клиент после записи читает
+# из основной БД ещё REPLICA_PIN_SECONDS секунд.
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['apps.api.replica.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+REPLICA_APPS = {'recipes', 'users'}
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.'
              'UserAttributeSimilarityValidator'},
@@ -89,11 +105,114 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Медиафайлы хранятся под именем-хешем содержимого: повторная
+# загрузка того же изображения не занимает места на диске.
+STORAGES = {
+    'default': {
+        'BACKEND': 'apps.api.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+# Файл без ссылок удаляется не раньше чем через IMAGE_RELEASE_GRACE
+# секунд после последней загрузки того же содержимого; оставшиеся
+# подбирает команда prune_images.
+IMAGE_RELEASE_GRACE = int(os.getenv('IMAGE_RELEASE_GRACE', 3600))
+
+# Файлы multipart-запросов пишутся на диск частями, а не в память.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Общий для всех воркеров gunicorn кэш (Redis): версии фрагментов
+# рецептов, снимки токенов, закрепление за основной БД и счётчики видны
+# каждому процессу, incr атомарен, а вытесняются давно не читанные ключи.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://redis:6379/0'),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('.FileBasedCache'):
+    # Только для разработки: каждая запись обходит весь каталог кэша,
+    # а при переполнении удаляет 1/CULL_FREQUENCY случайных ключей.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        'CULL_FREQUENCY': 10,
+    }
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60))
+# Попадания и промахи копятся в процессе и пишутся в кэш раз
+# в RECIPE_CACHE_STATS_EVERY рецептов.
+RECIPE_CACHE_STATS_EVERY = 1000
+# Промахи кэша собираются скомпилированным сериализатором
+# (apps.api.compiled); 0 — обычный путь DRF.
+FAST_SERIALIZER = os.getenv('FAST_SERIALIZER', '1') == '1'
+# Анонимный список рецептов собирается в JSON запросом PostgreSQL
+# (apps.api.sql_json); на других СУБД не действует.
+RECIPE_SQL_JSON = os.getenv('RECIPE_SQL_JSON', '0') == '1'
+
+# Автодополнение ингредиентов из отсортированного индекса в памяти
+# воркера (apps.api.ingredient_index); индекс пересобирается при
+# изменении справочника. Ответ на ?name= ограничен
+# INGREDIENT_SEARCH_LIMIT строками, 0 — без ограничения.
+INGREDIENT_INDEX = os.getenv('INGREDIENT_INDEX', '1') == '1'
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+# Файл справочника, общий для воркеров (apps.recipes.catalog): собирается
+# командой build_ingredient_catalog и пересобирается при изменениях.
+INGREDIENT_CATALOG_PATH = os.getenv(
+    'INGREDIENT_CATALOG_PATH', '/var/tmp/foodgram/ingredients.catalog')
+
+# Лента подписок: рецепты авторов с большим числом подписчиков
+# не раздаются по лентам, а читаются напрямую.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+FEED_BACKFILL = int(os.getenv('FEED_BACKFILL', 100))
+# Список таких авторов кэшируется на FEED_POPULAR_TTL секунд.
+FEED_POPULAR_TTL = int(os.getenv('FEED_POPULAR_TTL', 60))
+
+# Производные изображений (?image_size=): рамка (ширина, высота).
+# Строятся в пуле из IMAGE_WORKERS процессов; 0 — в процессе запроса
+# после коммита.
+IMAGE_DERIVATIVES = {
+    'thumb': (160, 160),
+    'card': (640, 640),
+    'full': (1600, 1600),
+}
+IMAGE_DERIVATIVE_FORMAT = os.getenv('IMAGE_DERIVATIVE_FORMAT', 'WEBP')
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# Варианты /api/media/<Ш>x<В>/<путь>: только перечисленные размеры.
+# Готовые файлы nginx отдаёт из IMAGE_RESIZE_ROOT без обращения
+# к Django; prune_resized_images держит кэш в IMAGE_RESIZE_MAX_MB.
+IMAGE_RESIZE_SIZES = os.getenv(
+    'IMAGE_RESIZE_SIZES', '160x160,320x320,640x640,1280x1280').split(',')
+IMAGE_RESIZE_ROOT = MEDIA_ROOT / 'resized'
+IMAGE_RESIZE_MAX_MB = int(os.getenv('IMAGE_RESIZE_MAX_MB', 1024))
+
+# Токен -> снимок пользователя в памяти процесса (LRU на TOKEN_CACHE_SIZE
+# записей, TOKEN_CACHE_TTL секунд) и при TOKEN_CACHE_SHARED_TTL > 0 —
+# в общем кэше. Версия пользователя в общем кэше проверяется при каждом
+# попадании. TOKEN_CACHE_SIZE = 0 отключает кэш.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 1024))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 30))
+TOKEN_CACHE_SHARED_TTL = int(os.getenv('TOKEN_CACHE_SHARED_TTL', 300))
+TOKEN_CACHE_STATS_EVERY = 100
+
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'apps.api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'apps.api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES':
-        ['rest_framework.authentication.TokenAuthentication'],
+        ['apps.api.authentication.CachedTokenAuthentication'],
     'DEFAULT_PERMISSION_CLASSES':
         ['rest_framework.permissions.AllowAny'],
     'DEFAULT_FILTER_BACKENDS': [
@@ -0,0 +1,55 @@
+"""
+Настройки тестов: SQLite вместо PostgreSQL, кэш в памяти процесса,
+медиафайлы во временном каталоге.
+
+Запуск из каталога backend:
+    python manage.py test apps.api.tests --settings=config.settings_test
+
+С TEST_DATABASE=postgresql тесты идут на PostgreSQL из переменных
+POSTGRES_* и DB_HOST; так запускаются и тесты только для PostgreSQL
+(сборка JSON в apps.api.sql_json).
+"""
+import atexit
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from .settings import *  # noqa: F401,F403
+
+# Вторая база — реплика для тестов маршрутизатора (apps.api.replica).
+# Маршрутизатор включают сами тесты через override_settings: пока
+# REPLICA_DATABASE не задан, схема создаётся в обеих базах.
+if os.getenv('TEST_DATABASE') == 'postgresql':
+    primary = DATABASES['default']  # noqa: F405
+    DATABASES = {
+        'default': primary,
+        'replica': {**primary, 'NAME': primary['NAME'] + '_replica'},
+    }
+else:
+    DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': ':memory:'},
+        'replica': {'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': ':memory:'},
+    }
+REPLICA_DATABASE = None
+
+# Миграция 0006 написана на SQL PostgreSQL, поэтому таблицы приложений
+# проекта создаются прямо по моделям.
+MIGRATION_MODULES = {'recipes': None, 'users': None}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+TEST_ROOT = Path(tempfile.mkdtemp(prefix='foodgram-test-'))
+atexit.register(shutil.rmtree, TEST_ROOT, ignore_errors=True)
+MEDIA_ROOT = TEST_ROOT / 'media'
+IMAGE_RESIZE_ROOT = MEDIA_ROOT / 'resized'
+INGREDIENT_CATALOG_PATH = str(TEST_ROOT / 'ingredients.catalog')
+IMAGE_WORKERS = 0
@@ -11,6 +11,7 @@ done
 echo "Postgres is up."
 
 python manage.py migrate --noinput
+python manage.py build_ingredient_catalog
 python manage.py collectstatic --noinput || true
 
 exec gunicorn config.wsgi:application --bind 0.0.0.0:8000 --workers 3 --timeout 90